@@ -18,6 +18,7 @@ setup(
     package_dir={'': 'src'},
     url='http://github.com/aeroxis/sultan',
     install_requires=[],
+    python_requires='>=3.7',
     classifiers=[
         "Development Status :: 5 - Production/Stable",
         "Environment :: Console",
@@ -26,13 +27,11 @@ setup(
         "Operating System :: MacOS",
         "Operating System :: MacOS :: MacOS X",
         "Programming Language :: Python",
-        "Programming Language :: Python :: 2",
-        "Programming Language :: Python :: 2.7",
         "Programming Language :: Python :: 3",
-        "Programming Language :: Python :: 3.3",
-        "Programming Language :: Python :: 3.4",
-        "Programming Language :: Python :: 3.5",
-        "Programming Language :: Python :: 3.6",
+        "Programming Language :: Python :: 3 :: Only",
+        "Programming Language :: Python :: 3.7",
+        "Programming Language :: Python :: 3.8",
+        "Programming Language :: Python :: 3.9",
         "Programming Language :: Unix Shell",
         "License :: OSI Approved :: MIT License"]
 )
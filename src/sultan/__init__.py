@@ -1 +1,15 @@
-from sultan.api import Sultan
\ No newline at end of file
+"""
+Sultan: Command and Rule over your Shell.
+
+`Sultan` is imported on first use, so that `import sultan` stays fast.
+"""
+
+__all__ = ['Sultan']
+
+
+def __getattr__(name):
+
+    if name == 'Sultan':
+        from sultan.api import Sultan
+        return Sultan
+    raise AttributeError("module '%s' has no attribute '%s'" % (__name__, name))
@@ -0,0 +1,137 @@
+"""
+Asyncio support for Sultan.
+
+`AsyncSultan` builds commands exactly like `Sultan`, but `run()` returns an
+awaitable `AsyncResult` instead of blocking until the command completes. The
+command is spawned with `asyncio.create_subprocess_shell`, so a single event
+loop can drive many commands at once without a thread per command::
+
+    import asyncio
+    from sultan.aio import AsyncSultan
+
+    async def main():
+        with AsyncSultan.load(cwd='/tmp') as s:
+            results = await asyncio.gather(
+                s.ls('-lah').run(),
+                s.du('-sh', '.').run())
+        for result in results:
+            print(result.stdout)
+
+    asyncio.run(main())
+"""
+
+import asyncio
+
+from .api import Sultan
+from .hooks import emit, group, new_id
+from .output import decode
+from .result import Result
+
+__all__ = ['AsyncSultan', 'AsyncResult']
+
+
+class AsyncResult(Result):
+    """
+    An awaitable `Result`. The command is started the first time the result is
+    awaited, and awaiting it again returns the same, completed result. The
+    hooks of the command are emitted once it is started.
+    """
+
+    def __init__(self, commands, context, env=None, executable=None, halt_on_nonzero=False, binary=False,
+                 command=None):
+        super(AsyncResult, self).__init__(None, commands, context, halt_on_nonzero=halt_on_nonzero, binary=binary)
+        self._env = env
+        self._executable = executable
+        self._command = command
+        self._task = None
+
+    def __await__(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._execute())
+        return self._task.__await__()
+
+    async def _execute(self):
+        context = self._context[-1] if self._context else {}
+        self._run_id = new_id()
+        emit('on_build', context, run_id=self._run_id, commands=self._commands, command=self._command)
+        try:
+            self._process = await asyncio.create_subprocess_shell(
+                self._commands,
+                env=self._env,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                executable=self._executable)
+        except Exception as e:
+            emit('on_error', context, run_id=self._run_id, commands=self._commands, exception=e)
+            self._exception = e
+            self.is_complete = True
+            self.dump_exception()
+            return self
+
+        emit('on_spawn', context, run_id=self._run_id, commands=self._commands, pid=self._process.pid)
+        try:
+            stdout, stderr = await self._process.communicate()
+        except BaseException as e:
+            # i.e.: the task awaiting the command was cancelled
+            emit('on_error', context, run_id=self._run_id, commands=self._commands, exception=e)
+            raise
+        if not self._binary:
+            stdout, stderr = decode(stdout), decode(stderr)
+        self._complete(self._process.returncode, stdout, stderr)
+        return self
+
+
+class AsyncSultan(Sultan):
+    """
+    The asyncio interface to Bash.
+    """
+
+    def run(self, halt_on_nonzero=True, quiet=False, q=False, streaming=False, binary=False):
+        """
+        After building your commands, `await` the result of `run()` to have
+        your code executed.
+        """
+        if streaming:
+            raise ValueError("AsyncSultan does not support 'streaming'.")
+
+        commands = str(self)
+        if not (quiet or q):
+            self._echo.cmd(commands)
+
+        env = self.plan.env
+        executable = self.plan.executable
+        command = self._command_name()
+        self.clear()
+
+        return AsyncResult(commands, self._context, env=env, executable=executable,
+                           halt_on_nonzero=halt_on_nonzero, binary=binary, command=command)
+
+    async def run_many(self, chains, max_workers=None, ordered=True, halt_on_nonzero=True, quiet=False, q=False,
+                       timeout=None):
+        """
+        Like `Sultan.run_many`, but awaitable: the chains run concurrently on
+        the event loop, with at most `max_workers` of them running at a time.
+        `map` is awaitable too::
+
+            results = await s.map("gzip {}", ["/tmp/a.log", "/tmp/b.log"], max_workers=2)
+        """
+        if timeout is not None:
+            raise ValueError("AsyncSultan does not support 'timeout'.")
+
+        semaphore = asyncio.Semaphore(max_workers) if max_workers else None
+
+        async def run(sultan):
+            # the command is only started once its result is awaited
+            result = sultan.run(halt_on_nonzero=halt_on_nonzero, quiet=quiet, q=q)
+            if semaphore is None:
+                return await result
+            async with semaphore:
+                return await result
+
+        sultans = self._chains(chains)
+        with group('run_many', self.current_context, chains=len(sultans)):
+            tasks = [asyncio.ensure_future(run(sultan)) for sultan in sultans]
+        if ordered:
+            return await asyncio.gather(*tasks)
+        return [await task for task in asyncio.as_completed(tasks)]
@@ -53,26 +53,30 @@ If you have more questions, check the docs! http://sultan.readthedocs.io/en/late
 
 import getpass
 import os
+import shlex
 import subprocess
-import sys
 
 from .core import Base
-from .config import Settings
+from .config import get_settings
 from .echo import Echo
+from .engine import Pipeline, compile_argv, compile_pipeline
 from .exceptions import InvalidContextError
+from .hooks import emit, group, in_group, new_id
+from .plan import ContextPlan
+from .process import Process
 from .result import Result
 
 __all__ = ['Sultan']
 
-if sys.version_info < (3, 0):
-    input = raw_input
-
 
 class Sultan(Base):
     """
     The Pythonic interface to Bash.
     """
 
+    # what `run` returns (NOT FOR PUBLIC USE)
+    _result_class = Result
+
     @classmethod
     def load(cls, 
         cwd=None, sudo=False, user=None, 
@@ -117,8 +121,30 @@ class Sultan(Base):
         self.commands = []
         self._context = [context] if context is not None else []
         self.logging_activated = context.get('logging') if context else False
-        self._echo = Echo(activated=self.logging_activated)
-        self.settings = Settings()
+        self._echo = Echo(activated=self.logging_activated, sampler=context.get('log_sampler') if context else None)
+        self._compile()
+
+    def _compile(self):
+        """
+        Compiles the current context into the `plan` that is applied to every
+        command.
+        """
+        self._plan = ContextPlan(self._context[-1] if self._context else None)
+
+    @property
+    def plan(self):
+        """
+        The `ContextPlan` of the current context: what it does to the commands
+        that are run (see `sultan.plan`).
+        """
+        return self._plan
+
+    @property
+    def settings(self):
+        """
+        The settings of the process (see `sultan.config`).
+        """
+        return get_settings()
 
     @property
     def current_context(self):
@@ -150,6 +176,15 @@ class Sultan(Base):
         # however, we do want to alert the user that they're using contexts badly.
         if len(self._context) == 0:
             raise InvalidContextError("You're using the 'with' block to load Sultan, but didn't provide a context with 'Sultan.context(...)'")
+
+        # share one SSH connection for all the commands run in this context
+        context = self.current_context
+        if context.get('multiplex') and context.get('hostname'):
+            from .ssh import ControlMaster
+            context['control_master'] = ControlMaster.acquire(
+                context['user'], context['hostname'], context['ssh_config'])
+
+        self._compile()
         return self
 
     def __exit__(self, type, value, traceback):
@@ -157,7 +192,11 @@ class Sultan(Base):
         Restores the context to previous context.
         """
         if len(self._context) > 0:
-            self._context.pop()
+            context = self._context.pop()
+            control_master = context.pop('control_master', None)
+            if control_master:
+                control_master.release()
+            self._compile()
 
     def __call__(self):
 
@@ -189,29 +228,89 @@ class Sultan(Base):
         self.commands = command.split(' ')
         return self.run(halt_on_nonzero=halt_on_nonzero, quiet=quiet, q=q, streaming=streaming)
 
-    def run(self, halt_on_nonzero=True, quiet=False, q=False, streaming=False):
+    def run(self, halt_on_nonzero=True, quiet=False, q=False, streaming=False, binary=False, max_memory=None,
+            timeout=None):
         """
         After building your commands, call `run()` to have your code executed.
+
+        With `binary=True`, the output isn't decoded: `stdout` and `stderr` of
+        the result are `BinaryOutput` objects, holding the raw bytes.
+
+        With `max_memory`, stdout or stderr that grow past `max_memory` bytes
+        are moved to a temporary file, and read from a memory map of the file
+        instead of being held in memory.
+
+        With `timeout`, the command is killed (see `Result.cancel`) if it
+        doesn't complete within `timeout` seconds, and the result is marked as
+        `timed_out`. When `halt_on_nonzero` is True, `subprocess.TimeoutExpired`
+        is raised.
+
+        Commands run with `streaming` or a `timeout` run in a session of their
+        own, so that cancelling them kills every process they started. Such
+        commands have no controlling terminal: Ctrl-C doesn't reach them, and
+        they can't prompt for a password on the terminal (i.e.: `sudo`
+        without a `NOPASSWD` rule, or `ssh` without a key).
         """
         commands = str(self)
         if not (quiet or q):
             self._echo.cmd(commands)
 
-        env = self._context[0].get('env', {}) if len(self._context) > 0 else os.environ
-        executable = self.current_context.get('executable')
+        run_id = new_id()
+        emit('on_build', self.current_context, run_id=run_id, commands=commands, command=self._command_name())
+
+        plan = self._plan
+        env = plan.env
+        argv = compile_argv(self.commands, plan)
+        stages = None if argv else compile_pipeline(self.commands, plan)
+
+        # commands that can be cancelled run in a session of their own, so
+        # that cancelling them kills the processes they started too
+        start_new_session = streaming or timeout is not None
         try:
-            process = subprocess.Popen(commands,
-                                       bufsize=1,
-                                       shell=True,
-                                       env=env,
-                                       stdin=subprocess.PIPE,
-                                       stdout=subprocess.PIPE,
-                                       stderr=subprocess.PIPE,
-                                       executable=executable,
-                                       universal_newlines=True)
-            result = Result(process, commands, self._context, streaming, halt_on_nonzero=halt_on_nonzero)
+            process = None
+            if stages:
+                # pipes and redirects between simple commands are wired directly
+                try:
+                    process = Pipeline(stages, cwd=plan.cwd, env=env, binary=binary,
+                                       start_new_session=start_new_session)
+                except OSError:
+                    process = None
+
+            elif argv:
+                # simple commands are started directly, without a shell
+                try:
+                    process = Process(argv,
+                                      bufsize=-1 if binary else 1,
+                                      cwd=plan.cwd,
+                                      env=env,
+                                      stdin=subprocess.PIPE,
+                                      stdout=subprocess.PIPE,
+                                      stderr=subprocess.PIPE,
+                                      universal_newlines=not binary,
+                                      start_new_session=start_new_session)
+                except OSError:
+                    # let the shell report errors, like a missing command
+                    process = None
+
+            if process is None:
+                process = Process(commands,
+                                  bufsize=-1 if binary else 1,
+                                  shell=True,
+                                  env=env,
+                                  stdin=subprocess.PIPE,
+                                  stdout=subprocess.PIPE,
+                                  stderr=subprocess.PIPE,
+                                  executable=plan.executable,
+                                  universal_newlines=not binary,
+                                  start_new_session=start_new_session)
+            emit('on_spawn', self.current_context, run_id=run_id, commands=commands, pid=process.pid)
+            result = self._result_class(process, commands, self._context, streaming,
+                                        halt_on_nonzero=halt_on_nonzero, binary=binary, max_memory=max_memory,
+                                        timeout=timeout, run_id=run_id)
 
         except Exception as e:
+            if process is None:
+                emit('on_error', self.current_context, run_id=run_id, commands=commands, exception=e)
             result = Result(None, commands, self._context, exception=e)
             result.dump_exception()
             if halt_on_nonzero:
@@ -222,6 +321,119 @@ class Sultan(Base):
         
         return result
 
+    def detach(self):
+        """
+        Moves the chain built so far into a new `Sultan` that shares this
+        instance's context, and clears this instance's buffer. This is how
+        chains are prepared for `run_many`.
+
+        Usage::
+
+            with Sultan.load(cwd='/tmp') as s:
+                chains = [s.ls('-lah').detach(), s.du('-sh', '.').detach()]
+                results = s.run_many(chains)
+        """
+        sultan = self.__class__(context=self.current_context if self._context else None)
+        sultan.commands = list(self.commands)
+        self.clear()
+        return sultan
+
+    def run_many(self, chains, max_workers=None, ordered=True, halt_on_nonzero=True, quiet=False, q=False,
+                 timeout=None):
+        """
+        Runs multiple command chains concurrently, with at most `max_workers`
+        of them running at a time, and returns a list of `Result` objects.
+
+        Each chain is either a `Sultan` with commands built on it (see
+        `detach`), or a string with a command line, which is run with this
+        instance's context.
+
+        When `ordered` is True, results are in the order the chains were given,
+        otherwise they are in the order the chains completed.
+
+        Usage::
+
+            s = Sultan()
+            results = s.run_many(["gzip /tmp/a.log", "gzip /tmp/b.log"], max_workers=4)
+        """
+        sultans = self._chains(chains)
+
+        def run(sultan):
+            return sultan.run(halt_on_nonzero=halt_on_nonzero, quiet=quiet, q=q, timeout=timeout)
+
+        # loaded on first use, to keep 'import sultan' fast
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        with group('run_many', self.current_context, chains=len(sultans)):
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = [executor.submit(in_group(run), sultan) for sultan in sultans]
+                if not ordered:
+                    futures = as_completed(futures)
+                return [future.result() for future in futures]
+
+    def _chains(self, chains):
+        """
+        Returns the chains given to `run_many`, as instances of this class.
+        """
+        sultans = []
+        for chain in chains:
+            if not isinstance(chain, Sultan):
+                command = chain
+                chain = self.__class__(context=self.current_context if self._context else None)
+                chain.commands = [command]
+            sultans.append(chain)
+        return sultans
+
+    def map(self, template, iterable, **kwargs):
+        """
+        Runs the command line `template` once for each item in `iterable`,
+        similar to `xargs`. Placeholders in `template` are filled in with
+        `str.format`; tuples are expanded into positional placeholders. Accepts
+        the same keyword arguments as `run_many`.
+
+        Usage::
+
+            # runs: 'gzip /tmp/a.log' and 'gzip /tmp/b.log'
+            s = Sultan()
+            s.map("gzip {}", ["/tmp/a.log", "/tmp/b.log"], max_workers=2)
+        """
+        chains = []
+        for item in iterable:
+            args = item if isinstance(item, tuple) else (item,)
+            chains.append(template.format(*args))
+        return self.run_many(chains, **kwargs)
+
+    def session(self):
+        """
+        Returns a `Session` that runs every command in one long-lived shell,
+        started with this instance's context.
+
+        Usage::
+
+            with Sultan.load(hostname='myserver.com') as s:
+                with s.session() as session:
+                    session.cd('/var/log').run()
+                    session.ls('-lah').run()  # runs in /var/log
+        """
+        from .session import Session
+        return Session(context=self.current_context if self._context else None)
+
+    def batch(self):
+        """
+        Returns a `Batch` that collects command chains, and runs all of them
+        in one shell (on a remote host: over one SSH connection) when the
+        `with` block exits. Each chain gets its own `Result`.
+
+        Usage::
+
+            with Sultan.load(hostname='myserver.com') as s:
+                with s.batch() as batch:
+                    uptime = batch.uptime().run()
+                    disk = batch.df('-h').run()
+                print(uptime.stdout, disk.rc)
+        """
+        from .batch import Batch
+        return Batch(context=self.current_context if self._context else None)
+
     def _add(self, command):
         """
         Private method that adds a custom command (see `pipe` and `and_`).
@@ -231,6 +443,23 @@ class Sultan(Base):
         self.commands.append(command)
         return self
 
+    def _command_name(self):
+        """
+        Returns the name of the first command of the chain, i.e.: 'tar'.
+        """
+        if not self.commands:
+            return None
+        command = self.commands[0]
+        if hasattr(command, 'command'):
+            return command.command
+
+        # chains given as text (i.e.: to `run_many`) are named by their program
+        try:
+            words = shlex.split(command)
+        except ValueError:
+            words = command.split()
+        return words[0] if words else None
+
     def clear(self):
 
         del self.commands[:]
@@ -238,9 +467,15 @@ class Sultan(Base):
 
     def __str__(self):
         """
-        Returns the chained commands that were built as a string.
+        Returns the chained commands that were built as a string, wrapped in
+        what the context does to them (see `plan`).
+        """
+        return self._plan.wrap(self._build_chain())
+
+    def _build_chain(self):
+        """
+        Returns the chained commands that were built, without the context.
         """
-        context = self.current_context
         SPECIAL_CASES = (Pipe, And, Redirect, Or)
         output = ""
         for i, cmd in enumerate(self.commands):
@@ -259,44 +494,7 @@ class Sultan(Base):
             cmd_str = str(cmd)
             output += separator + cmd_str
 
-        output = output.strip() + ";"
-
-        # update with 'cwd' context
-        cwd = context.get('cwd')
-        if cwd:
-            prepend = "cd %s && " % (cwd)
-            output = prepend + output
-
-        # update with 'src' context
-        src = context.get('src')
-        if src:
-            prepend = "source %s && " % (src)
-            output = prepend + output
-
-        # update with 'sudo' context
-        sudo = context.get('sudo')
-        user = context.get('user')
-        if sudo:
-            if user != getpass.getuser():
-                output = "sudo su - %s -c '%s'" % (user, output)
-            elif getpass.getuser() == 'root':
-                output = "su - %s -c '%s'" % (user, output)
-            else:
-                output = "sudo %s" % (output)
-
-        # if we have to ssh, prepare for the SSH command
-        ssh_config = context.get('ssh_config')
-        hostname = context.get('hostname')
-        if hostname:
-            params = {
-                'user': user,
-                'hostname': hostname,
-                'command': output, 
-                'ssh_config': ' %s ' % ssh_config if ssh_config else ' '
-            }
-            output = "ssh%(ssh_config)s%(user)s@%(hostname)s '%(command)s'" % (params)
-
-        return output
+        return output.strip() + ";"
 
     def spit(self):
         """
@@ -475,6 +673,10 @@ class Redirect(BaseCommand):
 
         descriptor = descriptor + ">" + (">" if append else "")
         self.command = "%s %s" % (descriptor, to_file)
+        self.to_file = str(to_file)
+        self.append = append
+        self.stdout = stdout
+        self.stderr = stderr
         self.sultan._add(self)
         return self.sultan
 
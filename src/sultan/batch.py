@@ -0,0 +1,188 @@
+"""
+Batched execution of many command chains.
+
+A `Batch` collects command chains and runs all of them as one script, in a
+single shell (locally, or over a single SSH connection when Sultan is loaded
+with a `hostname`). The script is sent to the shell on its stdin, so it doesn't
+have to be quoted into the command line. Each chain still gets its own
+`Result`::
+
+    with Sultan.load(hostname='myserver.com') as s:
+        with s.batch() as batch:
+            uptime = batch.uptime().run()
+            disk = batch.df('-h').run()
+
+        print(uptime.stdout, disk.rc)
+
+Like in a `Session`, each chain is followed by marker lines on stdout and
+stderr, which separate its output (and exit code) from the output of the next
+chain.
+"""
+
+import re
+import subprocess
+import uuid
+
+from .api import Sultan
+from .hooks import emit, group, new_id
+from .output import decode, output_encoding
+from .plan import shell_command
+from .result import Result
+from .session import wrap
+
+__all__ = ['Batch']
+
+
+class Batch(Sultan):
+    """
+    Runs command chains together, in one shell.
+    """
+
+    def __init__(self, context=None):
+
+        super(Batch, self).__init__(context=context)
+        self._id = uuid.uuid4().hex
+        self._queue = []
+        self.results = []
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, type, value, traceback):
+
+        if type is None:
+            self.execute()
+
+    def __str__(self):
+        """
+        Returns the chained commands that were built, as they are sent to the
+        shell. The context is applied once, when the shell is started.
+        """
+        return self._build_chain()
+
+    def run(self, halt_on_nonzero=True, quiet=False, q=False, streaming=False, binary=False):
+        """
+        Adds the commands that were built to the batch, and returns their
+        `Result`. The result is only complete once the batch was executed,
+        which happens when the `with` block exits (or when `execute()` is
+        called).
+        """
+        if streaming:
+            raise ValueError("Batch does not support 'streaming'.")
+
+        commands = str(self)
+        if not (quiet or q):
+            self._echo.cmd(commands)
+        name = self._command_name()
+        self.clear()
+
+        result = Result.pending(commands, self._context, binary=binary)
+        self._queue.append((result, halt_on_nonzero, name))
+        return result
+
+    def run_many(self, chains, max_workers=None, ordered=True, halt_on_nonzero=True, quiet=False, q=False,
+                 timeout=None):
+        """
+        Adds every chain to the batch (see `Sultan.run_many`), and returns
+        their `Result`s, in the order the chains were given. The chains run one
+        after the other when the batch is executed, so `max_workers` and
+        `ordered` have no effect.
+        """
+        if timeout is not None:
+            raise ValueError("Batch does not support 'timeout'.")
+
+        results, commands = [], self.commands
+        for chain in self._chains(chains):
+            self.commands = list(chain.commands)
+            results.append(self.run(halt_on_nonzero=halt_on_nonzero, quiet=quiet, q=q))
+        self.commands = commands
+        return results
+
+    def execute(self):
+        """
+        Runs every chain that was added to the batch in one shell, and returns
+        their `Result`s. If a chain that was added with `halt_on_nonzero`
+        failed, its exception is raised once all of the results are complete.
+        """
+        queue, self._queue = self._queue, []
+        if not queue:
+            return []
+
+        context = self.current_context
+        script = []
+        if context.get('src'):
+            script.append('. %s || exit $?\n' % context['src'])
+        if context.get('cwd'):
+            script.append('cd %s || exit $?\n' % context['cwd'])
+        for index, (result, _, _) in enumerate(queue):
+            script.append(wrap(result._commands, self._marker(index)))
+
+        env = self.plan.env
+
+        with group('batch', context, chains=len(queue)):
+            # the results emit their 'on_exit' hooks once they are completed
+            for result, _, name in queue:
+                result._run_id = new_id()
+                emit('on_build', context, run_id=result._run_id, commands=result._commands, command=name)
+
+            try:
+                # 'cwd' and 'src' are applied by the script, once for all chains
+                process = subprocess.Popen(shell_command(context if self._context else None),
+                                           shell=True,
+                                           env=env,
+                                           stdin=subprocess.PIPE,
+                                           stdout=subprocess.PIPE,
+                                           stderr=subprocess.PIPE)
+                for result, _, _ in queue:
+                    emit('on_spawn', context, run_id=result._run_id, commands=result._commands, pid=process.pid)
+                stdout, stderr = process.communicate(''.join(script).encode(output_encoding()))
+            except Exception as e:
+                for result, _, _ in queue:
+                    emit('on_error', context, run_id=result._run_id, commands=result._commands, exception=e)
+                raise
+
+            stdout_marker = re.compile(('\n%s (\\d+)\n' % self._marker('(\\d+)')).encode())
+            stderr_marker = re.compile(('\n%s\n' % self._marker('(\\d+)')).encode())
+            stdouts, rcs = self._split(stdout, stdout_marker)
+            stderrs, _ = self._split(stderr, stderr_marker)
+
+            for index, (result, _, _) in enumerate(queue):
+                rc = None
+                if index < len(rcs):
+                    rc = rcs[index]
+                elif index == len(rcs):
+                    # the shell exited (i.e.: the chain called 'exit')
+                    rc = process.returncode
+                result._complete(rc, self._decode(stdouts, index, result._binary),
+                                 self._decode(stderrs, index, result._binary))
+
+        self.results.extend(result for result, _, _ in queue)
+        for result, halt_on_nonzero, _ in queue:
+            if halt_on_nonzero and result.rc != 0:
+                result._halt_on_nonzero = True
+                result.dump_exception()
+
+        return [result for result, _, _ in queue]
+
+    def _marker(self, index):
+
+        return '__SULTAN_%s_%s__' % (self._id, index)
+
+    def _split(self, output, pattern):
+        """
+        Splits the output of the script at the markers, and returns the output
+        of each chain along with the numbers that followed the markers.
+        """
+        outputs, numbers, start = [], [], 0
+        for match in pattern.finditer(output):
+            outputs.append(output[start:match.start()])
+            numbers.append(int(match.group(match.lastindex)))
+            start = match.end()
+        outputs.append(output[start:])
+        return outputs, numbers
+
+    def _decode(self, outputs, index, binary):
+
+        output = outputs[index] if index < len(outputs) else b''
+        return output if binary else decode(output)
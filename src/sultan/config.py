@@ -1,6 +1,32 @@
+"""
+Sultan's settings.
+
+The settings are loaded once per process, the first time they are used: the
+defaults, updated with the upper-case names of the module named by the
+`SULTAN_SETTINGS_MODULE` environment variable, if it is set. They can't be
+changed in place; call `reload()` to load them again, and `on_change()` to be
+notified when they change::
+
+    from sultan import config
+
+    def log_format_changed(settings, changed):
+        if 'LOG_FORMAT' in changed:
+            print(settings.LOG_FORMAT)
+
+    config.on_change(log_format_changed)
+    os.environ['SULTAN_SETTINGS_MODULE'] = 'myproject.sultan_settings'
+    config.reload()
+"""
+
+import importlib
 import os
+import threading
+import types
+
 from .core import Base
 
+__all__ = ['Settings', 'get_settings', 'on_change', 'reload', 'remove_on_change', 'settings']
+
 DEFAULT_SETTINGS = {
     "HALT_ON_ERROR": True,
     "LOG_FORMAT": '%(log_color)s[%(name)s]: %(message)s',
@@ -17,18 +43,35 @@ DEFAULT_SETTINGS = {
 SULTAN_SETTINGS_MODULE_ENV = 'SULTAN_SETTINGS_MODULE'
 
 
+def _freeze(value):
+
+    if isinstance(value, dict):
+        return types.MappingProxyType(dict((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
 class Settings(Base):
+    """
+    An immutable snapshot of the settings. Use `get_settings()` for the
+    settings of the process, instead of loading a snapshot of your own.
+    """
 
-    def __init__(self):
+    def __init__(self, values=None):
         super(Settings, self).__init__()
-        self._settings = DEFAULT_SETTINGS.copy()
-        self._load_setting_module()
+        if values is None:
+            values = dict(DEFAULT_SETTINGS)
+            values.update(self._load_setting_module())
+        object.__setattr__(self, '_settings', _freeze(values))
+
+    @staticmethod
+    def _load_setting_module():
+        if SULTAN_SETTINGS_MODULE_ENV not in os.environ:
+            return {}
 
-    def _load_setting_module(self):
-        if SULTAN_SETTINGS_MODULE_ENV in os.environ:
-            settings = __import__(os.environ[SULTAN_SETTINGS_MODULE_ENV])
-            for k, v in settings.items():
-                self._settings[k] = v
+        module = importlib.import_module(os.environ[SULTAN_SETTINGS_MODULE_ENV])
+        return dict((k, getattr(module, k)) for k in dir(module) if k.isupper())
 
     def __getattr__(self, attr):
         try:
@@ -36,5 +79,77 @@ class Settings(Base):
         except KeyError:
             raise ValueError("Invalid Setting '%s'." % (attr))
 
+    def __setattr__(self, attr, value):
+        raise AttributeError("Settings can't be changed, see 'sultan.config.reload'.")
+
+    def as_dict(self):
+
+        return dict(self._settings)
+
+
+_current = None
+_lock = threading.Lock()
+_listeners = []
+
+
+def get_settings():
+    """
+    Returns the settings of the process, loading them on first use.
+    """
+    if _current is None:
+        with _lock:
+            if _current is None:
+                _set(Settings())
+    return _current
+
+
+def _set(new):
+
+    global _current
+    _current = new
+
+
+def reload():
+    """
+    Loads the settings again, and calls the callbacks registered with
+    `on_change` if any of them changed. Returns the new settings.
+    """
+    with _lock:
+        old, new = _current, Settings()
+        _set(new)
+        listeners = list(_listeners)
+
+    old_values, new_values = old.as_dict() if old else {}, new.as_dict()
+    changed = set(k for k in set(old_values) | set(new_values) if old_values.get(k) != new_values.get(k))
+    if old is not None and changed:
+        for callback in listeners:
+            callback(new, changed)
+    return new
+
+
+def on_change(callback):
+    """
+    Calls `callback(settings, changed)` when `reload()` changed the settings,
+    with the new settings and the names of the settings that changed.
+    """
+    with _lock:
+        _listeners.append(callback)
+    return callback
+
+
+def remove_on_change(callback):
+
+    with _lock:
+        _listeners.remove(callback)
+
+
+class _SettingsProxy(Base):
+    """
+    Stands for the settings of the process, as they are when it is used.
+    """
+
+    def __getattr__(self, attr):
+        return getattr(get_settings(), attr)
+
 
-settings = Settings()
+settings = _SettingsProxy()
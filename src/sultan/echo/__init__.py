@@ -1,28 +1,198 @@
-import logging
+"""
+Sultan's logging.
+
+The `logging` module, and the colored handler that Sultan logs with, are only
+loaded when the first line is logged, to keep `import sultan` fast.
+"""
+
+import threading
+import time
 from sultan.core import Base
-from sultan.echo.colorlog import StreamHandler, ColoredFormatter
-from sultan.config import settings
+from sultan.config import on_change, settings
+
+# created on first use, see `get_handler`
+_handler = None
+_handler_lock = threading.Lock()
+
+# set by `enable_queue`
+queued_handler = None
+
+
+def get_handler():
+    """
+    Returns the handler that writes Sultan's logs, creating it on first use.
+    """
+    global _handler
+    if _handler is None:
+        with _handler_lock:
+            if _handler is None:
+                from sultan.echo.colorlog import StreamHandler
+                handler = StreamHandler()
+                _set_formatter(settings, handler=handler)
+                _handler = handler
+                on_change(_set_formatter)
+    return _handler
+
+
+def __getattr__(name):
+
+    if name == 'handler':
+        return get_handler()
+    raise AttributeError("module '%s' has no attribute '%s'" % (__name__, name))
+
 
-handler = StreamHandler()
-handler.setFormatter(ColoredFormatter(
-    settings.LOG_FORMAT,
-    log_colors=settings.LOG_COLORS
-))
+def _set_formatter(settings, changed=('LOG_FORMAT', 'LOG_COLORS'), handler=None):
+    if 'LOG_FORMAT' in changed or 'LOG_COLORS' in changed:
+        from sultan.echo.colorlog import ColoredFormatter
+        handler = handler or _handler
+        handler.setFormatter(ColoredFormatter(
+            settings.LOG_FORMAT,
+            log_colors=settings.LOG_COLORS,
+            stream=handler.stream
+        ))
 
 
-def getLogger(name='', level=logging.DEBUG):
+def getLogger(name='', level=None):
+    import logging
     logger = logging.getLogger(name)
-    logger.addHandler(handler)
-    logger.setLevel(level)
+    logger.addHandler(queued_handler or get_handler())
+    logger.setLevel(logging.DEBUG if level is None else level)
     return logger
 
 
+def enable_queue(capacity=10000, batch_size=256, flush_interval=0.05):
+    """
+    Makes `Echo` queue its records for a background writer, instead of
+    writing them on the calling thread (see `QueuedHandler`).
+    """
+    import logging
+    from sultan.echo.queued import QueuedHandler
+    global queued_handler
+    if queued_handler is None:
+        queued_handler = QueuedHandler(get_handler(), capacity, batch_size, flush_interval)
+        logger = logging.getLogger('sultan')
+        logger.removeHandler(get_handler())
+        logger.addHandler(queued_handler)
+    return queued_handler
+
+
+def disable_queue():
+    """
+    Writes the queued records, and makes `Echo` write on the calling thread
+    again.
+    """
+    import logging
+    global queued_handler
+    if queued_handler is not None:
+        logger = logging.getLogger('sultan')
+        logger.removeHandler(queued_handler)
+        logger.addHandler(get_handler())
+        queued_handler.close()
+        queued_handler = None
+
+
+class LogSampler(Base):
+    """
+    Bounds how many lines of output (and commands) are logged, for a context
+    loaded with `Sultan.load(log_sampler=LogSampler(...))`:
+
+    - `first`: the first `first` lines are logged (or all of them, if
+      `first` is None).
+    - `every`: after that, 1 in every `every` lines is logged (or none, if
+      `every` is None).
+    - `rate`: at most `rate` lines are logged per second (with bursts of up to
+      `rate` lines).
+    - `summary_interval`: how often, in seconds, the number of lines that
+      were suppressed is logged.
+
+    Usage::
+
+        sampler = LogSampler(first=1000, every=100, rate=500)
+        with Sultan.load(log_sampler=sampler) as s:
+            s.cat('/var/log/syslog').run().print_stdout()
+    """
+
+    def __init__(self, first=1000, every=None, rate=None, summary_interval=10.0):
+
+        self.first = first
+        self.every = every
+        self.rate = rate
+        self.summary_interval = summary_interval
+        self.seen = 0
+        self.suppressed = 0
+        self._reported = 0
+        self._tokens = rate
+        self._refilled = self._summarized = time.monotonic()
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Returns True if the next line should be logged.
+        """
+        with self._lock:
+            self.seen += 1
+            if self.first is None or self.seen <= self.first:
+                allowed = True
+            else:
+                allowed = bool(self.every) and (self.seen - self.first) % self.every == 0
+
+            if allowed and self.rate is not None:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._refilled) * self.rate)
+                self._refilled = now
+                allowed = self._tokens >= 1
+                if allowed:
+                    self._tokens -= 1
+
+            if not allowed:
+                self.suppressed += 1
+            return allowed
+
+    def take_summary(self, force=False):
+        """
+        Returns how many lines were suppressed since the last summary, once
+        `summary_interval` passed (or right away, with `force`).
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.suppressed == self._reported or (not force and now - self._summarized < self.summary_interval):
+                return 0
+            suppressed, self._reported = self.suppressed - self._reported, self.suppressed
+            self._summarized = now
+            return suppressed
+
+
 class Echo(Base):
 
-    def __init__(self, activated=True):
+    def __init__(self, activated=True, sampler=None):
 
-        self.logger = getLogger(name='sultan')
+        self._logger = None
         self.activated = activated
+        self.sampler = sampler
+
+    @property
+    def logger(self):
+
+        if self._logger is None:
+            self._logger = getLogger(name='sultan')
+        return self._logger
+
+    def _sample(self):
+
+        if self.sampler is None:
+            return True
+        allowed = self.sampler.allow()
+        self.summarize(force=False)
+        return allowed
+
+    def summarize(self, force=True):
+        """
+        Logs how many lines the sampler suppressed, if any.
+        """
+        if self.activated and self.sampler is not None:
+            suppressed = self.sampler.take_summary(force)
+            if suppressed:
+                self.logger.warning("Suppressed %d log lines (see 'log_sampler')." % suppressed)
 
     def log(self, msg):
 
@@ -31,17 +201,17 @@ class Echo(Base):
 
     def cmd(self, msg):
 
-        if self.activated:
+        if self.activated and self._sample():
             self.logger.debug(msg)
 
     def stdout(self, msg):
 
-        if self.activated:
+        if self.activated and self._sample():
             self.logger.info(msg)
 
     def stderr(self, msg):
 
-        if self.activated:
+        if self.activated and self._sample():
             self.logger.critical(msg)
 
     def debug(self, msg):
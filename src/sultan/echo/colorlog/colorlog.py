@@ -5,6 +5,7 @@ from __future__ import absolute_import
 
 import logging
 import collections
+import re
 import sys
 
 from sultan.echo.colorlog.escape_codes import escape_codes, parse_colors
@@ -21,6 +22,24 @@ default_log_colors = {
     'CRITICAL': 'bold_red',
 }
 
+# The attributes of every record, which are never taken for color names
+record_attributes = frozenset(logging.makeLogRecord({}).__dict__) | {'message', 'asctime'}
+
+# Matches the plain fields (and the escaped delimiters) of a format string,
+# for each style
+field_patterns = {
+    '%': r'%%|%\((\w+)\)s',
+    '{': r'\{\{|\{(\w+)\}',
+    '$': r'\$\$|\$\{(\w+)\}|\$(\w+)',
+}
+
+# The format style classes of logging, for each style
+format_styles = {
+    '%': logging.PercentStyle,
+    '{': logging.StrFormatStyle,
+    '$': logging.StringTemplateStyle,
+}
+
 # The default format to use for each style
 default_formats = {
     '%': '%(log_color)s%(levelname)s:%(name)s:%(message)s',
@@ -68,7 +87,7 @@ class ColoredFormatter(logging.Formatter):
 
     def __init__(self, fmt=None, datefmt=None, style='%',
                  log_colors=None, reset=True,
-                 secondary_log_colors=None):
+                 secondary_log_colors=None, stream=None):
         """
         Set the format and colors the ColoredFormatter will use.
 
@@ -91,6 +110,14 @@ class ColoredFormatter(logging.Formatter):
             The format style to use. (*No meaning prior to Python 3.2.*)
         - secondary_log_colors (dict):
             Map secondary ``log_color`` attributes. (*New in version 2.6.*)
+        - stream (file):
+            The stream the records are written to. When it isn't a TTY, the
+            records are formatted without escape codes.
+
+        The color names in the format string are replaced with their escape
+        codes once, here, and the colors of each level are looked up once.
+        Records are then formatted directly, without wrapping them in a
+        ``ColoredRecord``.
         """
         if fmt is None:
             if sys.version_info > (3, 2):
@@ -109,13 +136,76 @@ class ColoredFormatter(logging.Formatter):
             log_colors if log_colors is not None else default_log_colors)
         self.secondary_log_colors = secondary_log_colors
         self.reset = reset
+        self.colored = stream is None or _isatty(stream)
+        self._level_colors = {}
+        self._compiled = self._compile(fmt, style)
+
+    def _compile(self, fmt, style):
+        """
+        Replace the color names in ``fmt`` with their escape codes (or with
+        nothing, when the output isn't colored). Returns False if the format
+        can't be compiled, in which case records are formatted through a
+        ``ColoredRecord``.
+        """
+        if sys.version_info < (3, 2) or not isinstance(fmt, str):
+            return False
+
+        secondary = set(name + '_log_color'
+                        for name in self.secondary_log_colors or ())
+
+        def replace(match):
+            if match.lastindex is None:
+                return match.group(0)
+            name = match.group(match.lastindex)
+            if name in record_attributes or name in secondary or \
+                    name == 'log_color':
+                return match.group(0)
+            try:
+                codes = parse_colors(name)
+            except KeyError:
+                # i.e.: set with ``extra``
+                return match.group(0)
+            return codes if self.colored else ''
+
+        self._fmt = re.sub(field_patterns[style], replace, fmt)
+        self._style = format_styles[style](self._fmt)
+        return True
 
     def color(self, log_colors, name):
         """Return escape codes from a ``log_colors`` dict."""
         return parse_colors(log_colors.get(name, ""))
 
+    def level_colors(self, levelname):
+        """
+        Return the ``log_color`` and the secondary colors of a level, as a
+        list of (attribute, escape codes).
+        """
+        colors = self._level_colors.get(levelname)
+        if colors is None:
+            colors = [('log_color', self.color(self.log_colors, levelname))]
+            for name, log_colors in (self.secondary_log_colors or {}).items():
+                colors.append((name + '_log_color',
+                               self.color(log_colors, levelname)))
+            if not self.colored:
+                colors = [(name, '') for name, _ in colors]
+            self._level_colors[levelname] = colors
+        return colors
+
     def format(self, record):
         """Format a message from a record object."""
+        if self._compiled:
+            # the record is shared with the other handlers, which mustn't
+            # see its colors: they are set on a copy
+            colored = record.__class__.__new__(record.__class__)
+            colored.__dict__.update(record.__dict__)
+            colored.__dict__.update(self.level_colors(record.levelname))
+            record = colored
+            message = super(ColoredFormatter, self).format(record)
+            if self.colored and self.reset and \
+                    not message.endswith(escape_codes['reset']):
+                message += escape_codes['reset']
+            return message
+
         record = ColoredRecord(record)
         record.log_color = self.color(self.log_colors, record.levelname)
 
@@ -139,12 +229,21 @@ class ColoredFormatter(logging.Formatter):
         return message
 
 
+def _isatty(stream):
+
+    try:
+        return stream.isatty()
+    except (AttributeError, ValueError):
+        # i.e.: a closed stream
+        return False
+
+
 class LevelFormatter(ColoredFormatter):
     """An extension of ColoredFormatter that uses per-level format strings."""
 
     def __init__(self, fmt=None, datefmt=None, style='%',
                  log_colors=None, reset=True,
-                 secondary_log_colors=None):
+                 secondary_log_colors=None, stream=None):
         """
         Set the per-loglevel format that will be used.
 
@@ -170,12 +269,13 @@ class LevelFormatter(ColoredFormatter):
         if sys.version_info > (2, 7):
             super(LevelFormatter, self).__init__(
                 fmt=fmt, datefmt=datefmt, style=style, log_colors=log_colors,
-                reset=reset, secondary_log_colors=secondary_log_colors)
+                reset=reset, secondary_log_colors=secondary_log_colors,
+                stream=stream)
         else:
             ColoredFormatter.__init__(
                 self, fmt=fmt, datefmt=datefmt, style=style,
                 log_colors=log_colors, reset=reset,
-                secondary_log_colors=secondary_log_colors)
+                secondary_log_colors=secondary_log_colors, stream=stream)
         self.style = style
         self.fmt = fmt
 
@@ -186,10 +286,10 @@ class LevelFormatter(ColoredFormatter):
             if sys.version_info > (3, 2):
                 # Update self._style because we've changed self._fmt
                 # (code based on stdlib's logging.Formatter.__init__())
-                if self.style not in logging._STYLES:
+                if self.style not in format_styles:
                     raise ValueError('Style must be one of: %s' % ','.join(
-                        list(logging._STYLES.keys())))
-                self._style = logging._STYLES[self.style][0](self._fmt)
+                        list(format_styles.keys())))
+                self._style = format_styles[self.style](self._fmt)
 
         if sys.version_info > (2, 7):
             message = super(LevelFormatter, self).format(record)
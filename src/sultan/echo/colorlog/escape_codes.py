@@ -6,6 +6,8 @@ http://en.wikipedia.org/wiki/ANSI_escape_code
 Uses colorama as an optional dependancy to support color on Windows
 """
 
+import functools
+
 try:
     import colorama
 except ImportError:
@@ -54,6 +56,7 @@ for prefix, prefix_name in PREFIXES:
         escape_codes[prefix_name + name] = esc(prefix + str(code))
 
 
+@functools.lru_cache(maxsize=None)
 def parse_colors(sequence):
-    """Return escape codes from a color sequence."""
+    """Return escape codes from a color sequence (cached per sequence)."""
     return ''.join(escape_codes[n] for n in sequence.split(',') if n)
@@ -0,0 +1,137 @@
+"""
+Logging that doesn't wait for the log stream.
+
+A `QueuedHandler` appends records to a bounded queue and returns. A
+background writer takes them off the queue in batches, and writes each batch
+with one write and one flush, so a slow terminal or pipe doesn't slow down the
+commands that are logged. When the queue is full, records are dropped, and the
+writer reports how many were dropped.
+
+Echo uses it after `sultan.echo.enable_queue()`.
+"""
+
+import logging
+import threading
+
+from collections import deque
+
+__all__ = ['QueuedHandler']
+
+
+class QueuedHandler(logging.Handler):
+    """
+    Hands the records over to a writer thread, which emits them with `target`.
+
+    - `capacity`: how many records may wait for the writer. More records are
+      dropped (and counted in `dropped`).
+    - `batch_size`: how many records the writer emits at once.
+    - `flush_interval`: how often the writer checks for records, in seconds.
+    """
+
+    def __init__(self, target, capacity=10000, batch_size=256, flush_interval=0.05):
+
+        super(QueuedHandler, self).__init__()
+        self.target = target
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+
+        # `deque.append` and `deque.popleft` are atomic, so the records are
+        # queued without taking a lock
+        self._records = deque()
+        self._reported = 0
+        self._drop_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='sultan-echo')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def emit(self, record):
+
+        if len(self._records) >= self.capacity:
+            with self._drop_lock:
+                self.dropped += 1
+            return
+
+        # the message is merged now, in case its arguments change
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        self._records.append(record)
+        if len(self._records) >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """
+        Writes the queued records now.
+        """
+        self._drain()
+
+    def close(self):
+
+        self._closed = True
+        self._wakeup.set()
+        self._thread.join()
+        self._drain()
+        super(QueuedHandler, self).close()
+
+    def _run(self):
+
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._drain()
+
+    def _drain(self):
+
+        with self._write_lock:
+            while True:
+                batch = []
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._records.popleft())
+                    except IndexError:
+                        break
+
+                if self.dropped > self._reported:
+                    batch.append(self._dropped_record())
+                if not batch:
+                    return
+                self._write(batch)
+
+    def _dropped_record(self):
+
+        with self._drop_lock:
+            dropped, self._reported = self.dropped - self._reported, self.dropped
+        return logging.makeLogRecord({
+            'name': 'sultan', 'levelname': 'WARNING', 'levelno': logging.WARNING,
+            'msg': 'Dropped %d log records, the log stream is too slow.' % dropped,
+        })
+
+    def _write(self, batch):
+
+        target = self.target
+        if not isinstance(target, logging.StreamHandler):
+            for record in batch:
+                target.handle(record)
+            return
+
+        # one write and one flush for the whole batch
+        lines = []
+        for record in batch:
+            try:
+                lines.append(target.format(record) + target.terminator)
+            except Exception:
+                target.handleError(record)
+        try:
+            target.acquire()
+            try:
+                target.stream.write(''.join(lines))
+                target.flush()
+            finally:
+                target.release()
+        except Exception:
+            target.handleError(batch[-1])
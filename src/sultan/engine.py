@@ -0,0 +1,353 @@
+"""
+Execution engines that run commands without a shell.
+
+Most commands don't need a shell: a single program with plain arguments can be
+started directly, which saves starting `/bin/sh` for every command. Pipes and
+redirects between such programs are wired up directly too, with a `Pipeline`.
+Anything else that relies on the shell (`&&`, `||`, variables, globs, quoting
+that can't be resolved statically, builtins, or a context that wraps the
+command) keeps running through the shell.
+"""
+
+import errno
+import io
+import os
+import shlex
+import subprocess
+import time
+
+from .core import Base
+from .output import decode
+from .plan import SHELL_CONTEXT, ContextPlan
+from .process import Process, ResourceUsage
+from .streams import read_pipes
+
+__all__ = ['Pipeline', 'Stage', 'compile_argv', 'compile_pipeline']
+
+# characters that make the shell do more than split arguments
+SHELL_CHARACTERS = frozenset('$`*?[]{}~<>|&;()#!\\\n')
+
+# commands that only exist in the shell, or behave differently outside of it
+SHELL_BUILTINS = frozenset([
+    '.', ':', '[[', 'alias', 'bg', 'break', 'builtin', 'case', 'cd', 'command',
+    'continue', 'declare', 'do', 'done', 'echo', 'elif', 'else', 'enable',
+    'esac', 'eval', 'exec', 'exit', 'export', 'fg', 'fi', 'for', 'function',
+    'getopts', 'hash', 'history', 'if', 'jobs', 'let', 'local', 'logout',
+    'popd', 'pushd', 'pwd', 'read', 'readonly', 'return', 'select', 'set',
+    'shift', 'shopt', 'source', 'then', 'time', 'times', 'trap', 'type',
+    'typeset', 'ulimit', 'umask', 'unalias', 'unset', 'until', 'wait', 'while',
+])
+
+def _split(text, program=True):
+    """
+    Splits `text` like the shell would, or returns None if that takes more
+    than splitting words.
+    """
+    if SHELL_CHARACTERS.intersection(text):
+        return None
+
+    try:
+        words = shlex.split(text)
+    except ValueError:
+        return None
+
+    if program and (not words or words[0] in SHELL_BUILTINS or '=' in words[0]):
+        return None
+
+    return words
+
+
+# the first bytes of the files that can be executed without a shell: scripts
+# with a '#!' line, and ELF and Mach-O binaries
+EXECUTABLE_HEADERS = (b'#!', b'\x7fELF', b'\xfe\xed\xfa\xce', b'\xfe\xed\xfa\xcf', b'\xce\xfa\xed\xfe',
+                      b'\xcf\xfa\xed\xfe', b'\xca\xfe\xba\xbe')
+
+
+def _which(program, cwd=None, env=None):
+    """
+    Returns the path of the executable that `program` starts in `cwd`, with
+    the PATH of `env`, or None if there isn't one.
+    """
+    if os.sep in program:
+        path = os.path.join(cwd or '', program)
+        return path if os.path.isfile(path) and os.access(path, os.X_OK) else None
+    import shutil
+    return shutil.which(program, path=os.pathsep.join(os.get_exec_path(env)))
+
+
+def _can_exec(path):
+    """
+    Returns False if the executable at `path` can only be run by the shell,
+    which runs files that aren't scripts with a '#!' line or binaries as
+    shell scripts.
+    """
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(4)
+    except OSError:
+        # i.e.: a binary that can be executed, but not read
+        return True
+    return header.startswith(EXECUTABLE_HEADERS)
+
+
+def _needs_shell(context):
+
+    if isinstance(context, ContextPlan):
+        return context.needs_shell
+    return any(context.get(key) for key in SHELL_CONTEXT)
+
+
+def compile_argv(commands, context):
+    """
+    Returns the argument list to run `commands` (the commands of a `Sultan`)
+    directly, or None if they have to run through the shell. `context` is a
+    context, or its `ContextPlan`.
+    """
+    from .api import Command
+
+    if len(commands) != 1 or not isinstance(commands[0], Command):
+        return None
+
+    if _needs_shell(context):
+        return None
+
+    return _split(str(commands[0]))
+
+
+class Stage(Base):
+    """
+    A program in a `Pipeline`, with the files its output is redirected to.
+    """
+
+    def __init__(self, argv):
+
+        self.argv = argv
+        self.stdout = None
+        self.stderr = None
+        self.append = False
+
+
+def compile_pipeline(commands, context):
+    """
+    Returns the `Stage`s to run `commands` (the commands of a `Sultan`) as a
+    `Pipeline`, or None if they have to run through the shell. Only commands
+    joined by pipes, with optional redirects, can run as a pipeline.
+    """
+    from .api import Command, Pipe, Redirect
+
+    if _needs_shell(context):
+        return None
+
+    stages = []
+    expect_command = True
+    for command in commands:
+        if isinstance(command, Command) and expect_command:
+            argv = _split(str(command))
+            if argv is None:
+                return None
+            stages.append(Stage(argv))
+            expect_command = False
+        elif isinstance(command, Pipe) and not expect_command:
+            expect_command = True
+        elif isinstance(command, Redirect) and not expect_command:
+            to_file = _split(command.to_file, program=False)
+            if not to_file or len(to_file) != 1:
+                return None
+            stage = stages[-1]
+            if command.stdout:
+                stage.stdout = to_file[0]
+            if command.stderr:
+                stage.stderr = to_file[0]
+            stage.append = command.append
+        else:
+            return None
+
+    if expect_command:
+        return None
+
+    return stages
+
+
+class Pipeline(Base):
+    """
+    Runs `Stage`s connected by OS pipes, without a shell. A `Pipeline` can be
+    used like the `subprocess.Popen` of the last stage, but its `returncodes`
+    hold the exit code of every stage. Like in the shell, `returncode` is the
+    exit code of the last stage.
+
+    The stderr of every stage goes to the pipeline's `stderr`. With
+    `start_new_session`, every stage runs in a session (and process group) of
+    its own.
+    """
+
+    def __init__(self, stages, cwd=None, env=None, binary=False, start_new_session=False):
+
+        self.binary = binary
+        self.processes = []
+        self.started = time.time()
+        self.clock = time.monotonic()
+        self.first_output = None
+        self.on_first_output = None
+        self._output = {'stdout': [], 'stderr': []}
+        self.returncode = None
+        self.returncodes = None
+
+        # what can fail is checked before any stage runs, and raises OSError,
+        # so that no stage runs again when the shell takes over
+        for stage in stages:
+            path = _which(stage.argv[0], cwd, env)
+            if path is None:
+                raise OSError(errno.ENOENT, os.strerror(errno.ENOENT), stage.argv[0])
+            if not _can_exec(path):
+                raise OSError(errno.ENOEXEC, os.strerror(errno.ENOEXEC), stage.argv[0])
+
+        # 'files' are closed once the stages are started, 'reads' only on errors
+        files, reads = [], []
+        try:
+            redirects = []
+            for stage in stages:
+                mode = 'ab' if stage.append else 'wb'
+                redirect_stdout = redirect_stderr = None
+                if stage.stdout:
+                    redirect_stdout = io.open(os.path.join(cwd or '', stage.stdout), mode)
+                    files.append(redirect_stdout)
+                if stage.stderr == stage.stdout and stage.stdout:
+                    redirect_stderr = redirect_stdout
+                elif stage.stderr:
+                    redirect_stderr = io.open(os.path.join(cwd or '', stage.stderr), mode)
+                    files.append(redirect_stderr)
+                redirects.append((redirect_stdout, redirect_stderr))
+
+            stdin_read, stdin_write = os.pipe()
+            stderr_read, stderr_write = os.pipe()
+            files.extend((stdin_read, stderr_write))
+            self.stdin = io.open(stdin_write, 'wb' if binary else 'w', -1 if binary else 1)
+            self.stderr = io.open(stderr_read, 'rb', 0)
+
+            stage_stdin = stdin_read
+            for stage, (redirect_stdout, redirect_stderr) in zip(stages, redirects):
+                stdout_read, stdout_write = os.pipe()
+                reads.append(stdout_read)
+                files.append(stdout_write)
+
+                try:
+                    process = Process(stage.argv,
+                                      cwd=cwd,
+                                      env=env,
+                                      stdin=stage_stdin,
+                                      stdout=redirect_stdout or stdout_write,
+                                      stderr=redirect_stderr or stderr_write,
+                                      start_new_session=start_new_session)
+                except OSError as e:
+                    if not self.processes:
+                        raise
+                    # the stages before it ran, so the shell must not run them again
+                    raise subprocess.SubprocessError("'%s' couldn't be started, after the stages before it "
+                                                     "were: %s" % (stage.argv[0], e))
+                self.processes.append(process)
+                if stage_stdin in reads:
+                    reads.remove(stage_stdin)
+                    os.close(stage_stdin)
+
+                # output redirected to a file doesn't reach the next stage
+                stage_stdin = stdout_read
+                if stage.stdout:
+                    reads.remove(stdout_read)
+                    os.close(stdout_read)
+                    stage_stdin, closed = os.pipe()
+                    reads.append(stage_stdin)
+                    os.close(closed)
+
+            reads.remove(stage_stdin)
+            self.stdout = io.open(stage_stdin, 'rb', 0)
+        except Exception:
+            self.kill()
+            for fd in reads:
+                os.close(fd)
+            for pipe in (getattr(self, 'stdin', None), getattr(self, 'stderr', None)):
+                if pipe:
+                    pipe.close()
+            raise
+        finally:
+            for f in files:
+                if isinstance(f, int):
+                    os.close(f)
+                else:
+                    f.close()
+
+    @property
+    def pid(self):
+
+        return self.processes[-1].pid
+
+    @property
+    def duration(self):
+        """
+        Returns how long the pipeline ran, until its last stage was reaped.
+        """
+        if not self.processes or any(process.duration is None for process in self.processes):
+            return None
+        return max(process.clock + process.duration for process in self.processes) - self.clock
+
+    @property
+    def rusage(self):
+        """
+        Returns the resources used by all of the stages.
+        """
+        return ResourceUsage.combine(process.rusage for process in self.processes)
+
+    def poll(self):
+
+        if all(process.poll() is not None for process in self.processes):
+            self._set_returncodes()
+        return self.returncode
+
+    def wait(self, timeout=None):
+
+        for process in self.processes:
+            process.wait(timeout)
+        self._set_returncodes()
+        return self.returncode
+
+    def kill(self):
+
+        for process in self.processes:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+
+    def communicate(self, timeout=None):
+        """
+        Reads stdout and stderr until they are closed, and waits for every
+        stage to complete. Like `subprocess.Popen.communicate`, raises
+        `subprocess.TimeoutExpired` after `timeout` seconds, and the output
+        read so far is kept for the next call.
+        """
+        self.stdin.close()
+        output = self._output
+        pipes = {'stdout': self.stdout, 'stderr': self.stderr}
+
+        def on_data(name, data):
+            if self.first_output is None:
+                self.first_output = time.monotonic()
+                if self.on_first_output:
+                    self.on_first_output()
+            output[name].append(data)
+
+        try:
+            read_pipes(pipes, on_data, timeout)
+        except subprocess.TimeoutExpired:
+            raise subprocess.TimeoutExpired(self.processes[-1].args, timeout)
+        for pipe in pipes.values():
+            pipe.close()
+        self.wait()
+
+        stdout, stderr = b''.join(output['stdout']), b''.join(output['stderr'])
+        if not self.binary:
+            stdout, stderr = decode(stdout), decode(stderr)
+        return stdout, stderr
+
+    def _set_returncodes(self):
+
+        self.returncodes = [process.returncode for process in self.processes]
+        self.returncode = self.returncodes[-1]
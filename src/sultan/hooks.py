@@ -0,0 +1,324 @@
+"""
+Hooks around the execution of commands.
+
+Callbacks registered for an event are called with a `HookEvent` every time
+the event happens, for every command run with `Sultan.run` (and with
+everything built on it, like `run_many` and `HostGroup`)::
+
+    from sultan.hooks import hooks
+
+    def log_slow_commands(event):
+        if event.result.timing.duration > 10:
+            print("%s took %.1fs" % (event.commands, event.result.timing.duration))
+
+    hooks.register('on_exit', log_slow_commands)
+
+The events are:
+
+- `on_build`: the command was built, and is about to be started.
+- `on_spawn`: the command's process was started (see `HookEvent.pid`).
+- `on_first_output`: the command wrote its first output.
+- `on_exit`: the command completed (see `HookEvent.result`).
+- `on_error`: the command failed, or couldn't be started (see
+  `HookEvent.exception`).
+- `on_group_start`, `on_group_end`: a group of commands, like a `Batch` or
+  the hosts of a `HostGroup`, started or completed (see `group`).
+
+Hooks can also be registered for a single context, with
+`Sultan.load(hooks=Hooks())`. `Tracer` turns the events into nested trace
+spans.
+"""
+
+import contextvars
+import functools
+import itertools
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+from .core import Base
+from .echo import Echo
+
+__all__ = ['EVENTS', 'Group', 'HookEvent', 'Hooks', 'Span', 'Tracer', 'emit', 'group', 'hooks', 'in_group']
+
+EVENTS = ('on_build', 'on_spawn', 'on_first_output', 'on_exit', 'on_error', 'on_group_start', 'on_group_end')
+
+# the group that commands run in, inherited by the threads that run them
+_current_group = contextvars.ContextVar('sultan_group', default=None)
+
+_ids = itertools.count(1)
+
+
+def new_id():
+    """
+    Returns a new id, for a run or a group.
+    """
+    return next(_ids)
+
+
+class Group(Base):
+    """
+    A group of commands that belong together, i.e.: a `Batch`, or a fan-out
+    over many hosts. Groups nest.
+    """
+
+    def __init__(self, name, attributes=None, parent=None):
+
+        self.id = new_id()
+        self.name = name
+        self.attributes = attributes or {}
+        self.parent = parent
+
+
+class HookEvent(Base):
+    """
+    What is passed to the callbacks of an event. Along with the `name` of the
+    event and when it happened (`time`, in seconds since the epoch), it holds
+    whatever is known about the command at that point:
+
+    - `run_id`: identifies the run of a command, across its events.
+    - `commands`: the command, as it is run.
+    - `command`: the name of the first command of the chain (i.e.: 'tar'),
+      for `on_build`.
+    - `context`: the context the command is run with.
+    - `pid`: the process id, once the command was started.
+    - `result`: the `Result`, once the command completed. Its `timing` and
+      `rusage` are set.
+    - `exception`: what went wrong, for `on_error`.
+    - `group`: the `Group` the command runs in, if any.
+    """
+
+    def __init__(self, name, run_id=None, commands=None, context=None, pid=None, result=None, exception=None,
+                 group=None, command=None):
+
+        self.name = name
+        self.time = time.time()
+        self.run_id = run_id
+        self.commands = commands
+        self.command = command
+        self.context = context or {}
+        self.pid = pid
+        self.result = result
+        self.exception = exception
+        self.group = group
+
+
+class Hooks(Base):
+    """
+    A registry of callbacks for the events in `EVENTS`.
+    """
+
+    def __init__(self):
+
+        self._callbacks = dict((event, []) for event in EVENTS)
+        self._echo = Echo()
+
+    def register(self, event, callback):
+        """
+        Calls `callback(event)` every time `event` happens.
+        """
+        if event not in self._callbacks:
+            raise ValueError("Unknown event '%s', expected one of: %s" % (event, ', '.join(EVENTS)))
+        self._callbacks[event].append(callback)
+        return callback
+
+    def unregister(self, event, callback):
+
+        self._callbacks[event].remove(callback)
+
+    def has_callbacks(self, event):
+
+        return bool(self._callbacks[event])
+
+    def emit(self, event):
+        """
+        Calls the callbacks registered for `event.name`.
+        """
+        for callback in list(self._callbacks[event.name]):
+            # a broken hook must not break the command
+            try:
+                callback(event)
+            except Exception as e:
+                self._echo.warn("Hook '%s' failed for '%s': %s" % (event.name, event.commands, e))
+
+
+# the process-wide hooks
+hooks = Hooks()
+
+
+def emit(name, context=None, **data):
+    """
+    Emits the event `name` to the process-wide hooks, and to the hooks of
+    `context`, if any.
+    """
+    registries = [registry for registry in (hooks, (context or {}).get('hooks')) if registry]
+    registries = [registry for registry in registries if registry.has_callbacks(name)]
+    if not registries:
+        return
+
+    data.setdefault('group', _current_group.get())
+    event = HookEvent(name, context=context, **data)
+    for registry in registries:
+        registry.emit(event)
+
+
+@contextmanager
+def group(name, context=None, **attributes):
+    """
+    Runs the commands of the `with` block in a new `Group`, nested in the
+    current group, if any::
+
+        with group('deploy'):
+            s.git('pull').run()
+            s.make('install').run()
+    """
+    current = Group(name, attributes, _current_group.get())
+    token = _current_group.set(current)
+    emit('on_group_start', context, group=current)
+    try:
+        yield current
+    finally:
+        _current_group.reset(token)
+        emit('on_group_end', context, group=current)
+
+
+def in_group(function):
+    """
+    Returns `function`, bound to the current group. This is how commands that
+    run in another thread (i.e.: in a `ThreadPoolExecutor`) keep their group.
+    A bound function can only run in one thread at a time.
+    """
+    return functools.partial(contextvars.copy_context().run, function)
+
+
+class Span(Base):
+    """
+    A trace span, emitted by a `Tracer`. Ids are hex strings, and times are
+    seconds since the epoch.
+    """
+
+    def __init__(self, name, parent=None, attributes=None):
+
+        self.name = name
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.start_time = time.time()
+        self.end_time = None
+        self.attributes = attributes or {}
+        self.events = []
+        self.status = 'ok'
+
+    def add_event(self, name, **attributes):
+
+        self.events.append((name, time.time(), attributes))
+
+    def __repr__(self):
+
+        return '<Span: %s %s>' % (self.name, self.span_id)
+
+
+class Tracer(Base):
+    """
+    Turns hook events into trace spans: a span for every command, nested in a
+    span for every group the command ran in. `export(span)` is called with
+    every span once it ends, i.e.: to hand it over to a tracing pipeline::
+
+        tracer = Tracer(export=lambda span: print(span.name, span.attributes))
+        tracer.install()
+
+        with HostGroup.load(hostnames=['web1', 'web2']) as group:
+            group.uptime().run()  # a 'host_group' span, with a span per host
+    """
+
+    def __init__(self, export):
+
+        self.export = export
+        self._spans = {}
+        self._lock = threading.Lock()
+
+    def install(self, registry=None):
+        """
+        Registers the tracer with `registry` (by default, the process-wide
+        hooks).
+        """
+        registry = registry or hooks
+        for event in EVENTS:
+            registry.register(event, getattr(self, '_' + event))
+        return self
+
+    def uninstall(self, registry=None):
+
+        registry = registry or hooks
+        for event in EVENTS:
+            registry.unregister(event, getattr(self, '_' + event))
+
+    def _group_span(self, group):
+
+        return self._spans.get(('group', group.id)) if group else None
+
+    def _on_group_start(self, event):
+
+        with self._lock:
+            parent = self._group_span(event.group.parent)
+            self._spans[('group', event.group.id)] = Span(event.group.name, parent, dict(event.group.attributes))
+
+    def _on_group_end(self, event):
+
+        with self._lock:
+            span = self._spans.pop(('group', event.group.id), None)
+        self._end(span)
+
+    def _on_build(self, event):
+
+        attributes = {'command': event.commands}
+        if event.context.get('hostname'):
+            attributes['hostname'] = event.context['hostname']
+        with self._lock:
+            self._spans[('run', event.run_id)] = Span('sultan.run', self._group_span(event.group), attributes)
+
+    def _on_spawn(self, event):
+
+        span = self._spans.get(('run', event.run_id))
+        if span:
+            span.attributes['pid'] = event.pid
+            span.add_event('spawn')
+
+    def _on_first_output(self, event):
+
+        span = self._spans.get(('run', event.run_id))
+        if span:
+            span.add_event('first_output')
+
+    def _on_exit(self, event):
+
+        with self._lock:
+            span = self._spans.pop(('run', event.run_id), None)
+        if span:
+            result = event.result
+            span.attributes['rc'] = result.rc
+            if result.rusage:
+                span.attributes['cpu_time'] = result.rusage.cpu_time
+                span.attributes['max_rss'] = result.rusage.max_rss
+            if result.timed_out:
+                span.attributes['timed_out'] = True
+            if not result.is_success:
+                span.status = 'error'
+            self._end(span)
+
+    def _on_error(self, event):
+
+        # commands that couldn't be started have no 'on_exit'
+        with self._lock:
+            span = self._spans.pop(('run', event.run_id), None)
+        if span:
+            span.status = 'error'
+            span.attributes['error'] = repr(event.exception)
+            self._end(span)
+
+    def _end(self, span):
+
+        if span:
+            span.end_time = time.time()
+            self.export(span)
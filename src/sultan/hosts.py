@@ -0,0 +1,289 @@
+"""
+Running commands on many hosts at once.
+
+A `HostGroup` builds commands exactly like `Sultan`, but `run()` runs them on
+every host of the group concurrently, with at most `max_workers` hosts at a
+time, and returns a `HostResults` mapping each host to its `Result`::
+
+    from sultan.hosts import HostGroup
+
+    with HostGroup.load(hostnames=['web1', 'web2', 'web3'], max_workers=10) as group:
+        results = group.uptime().run()
+
+    print(results['web1'].stdout)
+    print("%d succeeded, %d failed" % (results.success_count, results.failure_count))
+
+Hosts that need a different SSH configuration than the rest of the group get
+their own `SSHConfig` with `ssh_configs`::
+
+    HostGroup.load(hostnames=['web1', 'db1'],
+                   ssh_config=SSHConfig(identity_file='~/.ssh/web'),
+                   ssh_configs={'db1': SSHConfig(port=2222)})
+
+With `streaming=True`, `run()` returns a `HostStream` instead, which yields
+the lines of every host as they arrive, tagged with the host::
+
+    with group.tail('-f', '/var/log/syslog').run(streaming=True) as stream:
+        for hostname, name, line in stream:
+            print(hostname, line)
+"""
+
+import asyncio
+import functools
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from queue import Empty, Queue
+
+from .api import Sultan, SSHConfig
+from .core import Base
+from .hooks import group, in_group
+from .result import Result
+
+__all__ = ['HostGroup', 'HostResults', 'HostStream']
+
+
+class HostResults(OrderedDict):
+    """
+    The `Result` of every host of a `HostGroup`, in the order of the hosts.
+    """
+
+    @property
+    def succeeded(self):
+        """
+        Returns the hosts the commands succeeded on.
+        """
+        return [host for host, result in self.items() if result.is_success]
+
+    @property
+    def failed(self):
+        """
+        Returns the hosts the commands failed on.
+        """
+        return [host for host, result in self.items() if not result.is_success]
+
+    @property
+    def success_count(self):
+
+        return len(self.succeeded)
+
+    @property
+    def failure_count(self):
+
+        return len(self.failed)
+
+    @property
+    def is_success(self):
+        """
+        Returns True if the commands succeeded on every host.
+        """
+        return all(result.is_success for result in self.values())
+
+
+class HostGroup(Sultan):
+    """
+    The Pythonic interface to Bash, on many hosts at once.
+    """
+
+    @classmethod
+    def load(cls, hostnames=None, ssh_configs=None, max_workers=None, **kwargs):
+
+        ssh_configs = ssh_configs or {}
+        for hostname, ssh_config in ssh_configs.items():
+            if not isinstance(ssh_config, SSHConfig):
+                msg = "The config passed for '%s' (%s) must be an instance of SSHConfig." % \
+                    (hostname, ssh_config)
+                raise ValueError(msg)
+
+        kwargs['hostnames'] = list(hostnames or [])
+        kwargs['ssh_configs'] = dict((hostname, str(ssh_config)) for hostname, ssh_config in ssh_configs.items())
+        kwargs['max_workers'] = max_workers
+        return super(HostGroup, cls).load(**kwargs)
+
+    @property
+    def hostnames(self):
+
+        return self.current_context.get('hostnames', [])
+
+    def run(self, halt_on_nonzero=False, quiet=False, q=False, streaming=False, binary=False,
+            max_memory=None, max_workers=None, timeout=None):
+        """
+        Runs the commands that were built on every host of the group, and
+        returns a `HostResults`. At most `max_workers` hosts (by default, the
+        `max_workers` the group was loaded with) run the commands at a time.
+
+        Unlike `Sultan.run`, a failure on some of the hosts doesn't raise by
+        default: check `failed` on the results instead. Hosts that don't
+        complete within `timeout` seconds fail, and are marked as `timed_out`.
+
+        With `streaming=True`, the commands are started on every host at once,
+        and a `HostStream` of their output is returned.
+        """
+        sultans = OrderedDict((hostname, self._host(hostname)) for hostname in self.hostnames)
+        self.clear()
+
+        if streaming:
+            return HostStream(sultans, binary=binary, quiet=quiet or q, timeout=timeout)
+
+        def run(sultan):
+            with sultan:
+                return sultan.run(halt_on_nonzero=halt_on_nonzero, quiet=quiet, q=q, binary=binary,
+                                  max_memory=max_memory, timeout=timeout)
+
+        max_workers = max_workers or self.current_context.get('max_workers')
+        with group('host_group', self.current_context, hostnames=list(sultans)):
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = [(hostname, executor.submit(in_group(run), sultan)) for hostname, sultan in sultans.items()]
+                return HostResults((hostname, future.result()) for hostname, future in futures)
+
+    def _host(self, hostname):
+        """
+        Returns a `Sultan` with the commands that were built, that runs them on
+        `hostname`.
+        """
+        context = dict(self.current_context, hostname=hostname)
+        context['ssh_config'] = context['ssh_configs'].get(hostname, context['ssh_config'])
+        for key in ('hostnames', 'ssh_configs', 'max_workers'):
+            context.pop(key)
+
+        sultan = Sultan(context=context)
+        sultan.commands = list(self.commands)
+        return sultan
+
+
+class HostStream(Base):
+    """
+    The output of commands that run on many hosts, merged into one stream.
+
+    Iterating over the stream (with `for`, or with `async for`) yields a
+    `(hostname, name, line)` tuple for every line of stdout and stderr (`name`
+    is 'stdout' or 'stderr'), as soon as the line arrives. Iteration stops
+    once the commands completed on every host. The pipes of every host are
+    read by the process-wide `Reactor`, so no host is polled.
+
+    The commands are run with `Sultan.run(streaming=True)`, and `results`
+    maps every host to its `Result`. Hosts whose commands couldn't be started
+    are in `errors`, with the exception that was raised.
+    """
+
+    # what the reactor's callbacks put on the queue once a host's command exits
+    _EXIT = object()
+
+    def __init__(self, sultans, binary=False, quiet=False, timeout=None):
+
+        self.results = OrderedDict()
+        self.processes = OrderedDict()
+        self.returncodes = OrderedDict((hostname, None) for hostname in sultans)
+        self.errors = OrderedDict()
+        self._queue = Queue()
+        self._running = len(sultans)
+        self._loop = None
+        self._ready = None
+
+        for hostname, sultan in sultans.items():
+            sultan._result_class = functools.partial(_HostResult, self, hostname)
+            result = sultan.run(halt_on_nonzero=False, quiet=quiet, streaming=True, binary=binary,
+                                timeout=timeout)
+            self.results[hostname] = result
+            if result._process is None:
+                self.errors[hostname] = result._exception
+                self._running -= 1
+                continue
+
+            # like stdin=DEVNULL, so that 'ssh' doesn't wait for input
+            result._process.stdin.close()
+            self.processes[hostname] = result._process
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, type, value, traceback):
+
+        self.close()
+
+    def __iter__(self):
+
+        while True:
+            item = self._next(block=True)
+            if item is None:
+                return
+            yield item
+
+    def __aiter__(self):
+
+        self._ready = asyncio.Event()
+        self._loop = asyncio.get_event_loop()
+        return self
+
+    async def __anext__(self):
+
+        while True:
+            # cleared before checking the queue, so no wake-up is missed
+            self._ready.clear()
+            try:
+                item = self._next(block=False)
+            except Empty:
+                await self._ready.wait()
+                continue
+            if item is None:
+                raise StopAsyncIteration
+            return item
+
+    @property
+    def is_complete(self):
+
+        return self._running == 0 and self._queue.empty()
+
+    def close(self):
+        """
+        Stops the commands that are still running, i.e.: `tail -f`.
+        """
+        for result in self.results.values():
+            result.cancel()
+
+    def _put(self, item):
+        """
+        Called by the `Reactor` for every line, and once a host's command exits.
+        """
+        self._queue.put(item)
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._ready.set)
+
+    def _next(self, block):
+        """
+        Returns the next line, or None once every host's command completed.
+        Raises `Empty` if `block` is False and no line has arrived yet.
+        """
+        while True:
+            if self._running == 0 and self._queue.empty():
+                return None
+            item = self._queue.get(block)
+            if item[0] is not self._EXIT:
+                return item
+            self.returncodes[item[1]] = item[2]
+            self._running -= 1
+
+
+class _HostResult(Result):
+    """
+    A streaming `Result` that puts the lines of its host on a `HostStream`,
+    instead of keeping them.
+    """
+
+    def __init__(self, stream, hostname, *args, **kwargs):
+
+        self._stream = stream
+        self._hostname = hostname
+        super(_HostResult, self).__init__(*args, **kwargs)
+
+    def _on_line(self, name, line):
+
+        self._on_first_output()
+        self._stream._put((self._hostname, name, line))
+
+    def _on_exit(self, rc):
+
+        super(_HostResult, self)._on_exit(rc)
+        self._stream._put((HostStream._EXIT, self._hostname, rc))
@@ -0,0 +1,298 @@
+"""
+Metrics for the commands that Sultan runs.
+
+`Metrics` counts the commands run with `Sultan.run` (and with everything built
+on it, like `run_many`, `Batch` and `HostGroup`), and records how long they
+took, by command name, hostname and exit status. The metrics are exported in
+the Prometheus text format, to a file or over HTTP::
+
+    from sultan.metrics import Metrics
+
+    metrics = Metrics().install()
+
+    # i.e.: for the textfile collector of the node exporter
+    metrics.write('/var/lib/node_exporter/sultan.prom')
+
+    # or, to be scraped
+    metrics.serve(port=9200)
+
+The metrics are:
+
+- `sultan_commands_total`: a counter of the commands that completed.
+- `sultan_command_duration_seconds`: a histogram of how long they ran.
+
+Both have a `command` (the name of the first command of the chain, i.e.:
+'tar'), a `hostname` (empty for local commands) and a `status` label. The
+status is the exit code, 'timeout' for commands that timed out, or 'error' for
+commands that couldn't be started.
+"""
+
+import bisect
+import os
+import tempfile
+import threading
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from .core import Base
+from .hooks import hooks
+
+__all__ = ['Counter', 'Histogram', 'Metrics', 'Registry']
+
+# the default buckets of the Prometheus clients, stretched for long-running commands
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value):
+
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names, values, extra=()):
+
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, _escape(value)) for name, value in pairs)
+
+
+class Counter(Base):
+    """
+    A value that only goes up, for every combination of `labelnames`.
+    """
+
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+
+        labels = tuple(str(label) for label in labels)
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, labels=()):
+
+        return self._values.get(tuple(str(label) for label in labels), 0)
+
+    def samples(self):
+        """
+        Returns the (name, labels, value) of every sample, with the labels
+        formatted.
+        """
+        with self._lock:
+            values = sorted(self._values.items())
+        return [(self.name, _format_labels(self.labelnames, labels), value) for labels, value in values]
+
+
+class Histogram(Base):
+    """
+    Counts observed values into cumulative buckets, for every combination of
+    `labelnames`.
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+
+        labels = tuple(str(label) for label in labels)
+        with self._lock:
+            if labels not in self._values:
+                # a count per bucket (and one for '+Inf'), and the sum
+                self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts, _ = self._values[labels]
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[labels][1] += value
+
+    def get(self, labels=()):
+        """
+        Returns the count and the sum of the observed values.
+        """
+        counts, total = self._values.get(tuple(str(label) for label in labels), ([0], 0.0))
+        return sum(counts), total
+
+    def samples(self):
+
+        with self._lock:
+            values = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._values.items())
+
+        samples = []
+        for labels, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = (('le', _format_value(bound)),)
+                samples.append((self.name + '_bucket', _format_labels(self.labelnames, labels, le), cumulative))
+            samples.append((self.name + '_sum', _format_labels(self.labelnames, labels), total))
+            samples.append((self.name + '_count', _format_labels(self.labelnames, labels), cumulative))
+        return samples
+
+
+class Registry(Base):
+    """
+    A set of metrics, exported together.
+    """
+
+    def __init__(self):
+
+        self._metrics = []
+
+    def register(self, metric):
+
+        self._metrics.append(metric)
+        return metric
+
+    def exposition(self):
+        """
+        Returns the metrics in the Prometheus text format.
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.append('# HELP %s %s' % (metric.name, metric.documentation.replace('\\', '\\\\')))
+            lines.append('# TYPE %s %s' % (metric.name, metric.type))
+            for name, labels, value in metric.samples():
+                lines.append('%s%s %s' % (name, labels, _format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """
+        Writes the metrics to `path`. The file is replaced at once, so that it
+        is never read half-written.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.sultan-metrics-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(self.exposition())
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, path)
+        except Exception:
+            os.unlink(tmp)
+            raise
+
+    def serve(self, port, address='127.0.0.1'):
+        """
+        Serves the metrics over HTTP on `address:port`, from a daemon thread,
+        and returns the server. Call `shutdown()` on it to stop serving.
+        """
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+
+                body = registry.exposition().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+
+                pass
+
+        server = HTTPServer((address, port), Handler)
+        thread = threading.Thread(target=server.serve_forever, name='sultan-metrics')
+        thread.daemon = True
+        thread.start()
+        return server
+
+
+class Metrics(Registry):
+    """
+    A `Registry` of metrics about the commands that are run. Start recording
+    with `install()`.
+    """
+
+    LABELS = ('command', 'hostname', 'status')
+
+    # the most runs that are tracked between 'on_build' and 'on_exit': the
+    # oldest are forgotten, i.e. runs that were interrupted before completing
+    MAX_RUNNING = 10000
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+
+        super(Metrics, self).__init__()
+        self.commands = self.register(Counter(
+            'sultan_commands_total', 'Commands run by Sultan.', self.LABELS))
+        self.duration = self.register(Histogram(
+            'sultan_command_duration_seconds', 'How long the commands run by Sultan took.', self.LABELS, buckets))
+        self._running = {}
+        self._lock = threading.Lock()
+
+    def install(self, registry=None):
+        """
+        Registers with `registry` (by default, the process-wide hooks).
+        """
+        registry = registry or hooks
+        registry.register('on_build', self._on_build)
+        registry.register('on_exit', self._on_exit)
+        registry.register('on_error', self._on_error)
+        return self
+
+    def uninstall(self, registry=None):
+
+        registry = registry or hooks
+        registry.unregister('on_build', self._on_build)
+        registry.unregister('on_exit', self._on_exit)
+        registry.unregister('on_error', self._on_error)
+
+    def _on_build(self, event):
+
+        with self._lock:
+            self._running[event.run_id] = (event.command or '', event.context.get('hostname') or '', event.time)
+            if len(self._running) > self.MAX_RUNNING:
+                del self._running[next(iter(self._running))]
+
+    def _on_exit(self, event):
+
+        with self._lock:
+            running = self._running.pop(event.run_id, None)
+        if running:
+            command, hostname, started = running
+            result = event.result
+            status = 'timeout' if result.timed_out else result.rc
+            timing = result.timing
+            duration = timing.duration if timing and timing.duration is not None else event.time - started
+            self._record(command, hostname, status, duration)
+
+    def _on_error(self, event):
+
+        # commands that couldn't be started have no 'on_exit'
+        with self._lock:
+            running = self._running.pop(event.run_id, None)
+        if running:
+            command, hostname, started = running
+            self._record(command, hostname, 'error', event.time - started)
+
+    def _record(self, command, hostname, status, duration):
+
+        labels = (command, hostname, status)
+        self.commands.inc(labels)
+        self.duration.observe(duration, labels)
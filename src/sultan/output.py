@@ -0,0 +1,238 @@
+"""
+Containers for the output of a command.
+"""
+
+import locale
+import mmap
+import re
+
+from array import array
+
+from .core import Base
+
+__all__ = ['BinaryOutput', 'TextOutput', 'SpillBuffer', 'decode', 'iter_lines', 'output_encoding']
+
+# the whitespace removed by `str.strip`, for ASCII compatible encodings
+WHITESPACE = b' \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f'
+
+# the line boundaries of `str.splitlines`
+LINE_BREAK = re.compile(u'\r\n|[\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]')
+
+
+def output_encoding():
+    """
+    Returns the encoding of the output of commands, like
+    `universal_newlines=True` does: the preferred encoding of the locale.
+    """
+    return locale.getpreferredencoding(False)
+
+
+def decode(data, encoding=None, errors='strict'):
+    """
+    Decodes the output of a command like `universal_newlines=True`, which is
+    what `Sultan.run` uses: with `encoding` (by default, `output_encoding()`),
+    and with '\\r\\n' and '\\r' translated to '\\n'.
+    """
+    text = data.decode(encoding or output_encoding(), errors)
+    return text.replace('\r\n', '\n').replace('\r', '\n')
+
+
+def iter_lines(text):
+    """
+    Yields the lines of `text` one at a time, without splitting all of it.
+    The lines are the same as those of `text.splitlines()`.
+    """
+    start = 0
+    for match in LINE_BREAK.finditer(text):
+        yield text[start:match.start()]
+        start = match.end()
+    if start < len(text):
+        yield text[start:]
+
+
+class BinaryOutput(Base):
+    """
+    The raw output of a command, run with `binary=True`.
+
+    The output is kept as the `bytes` the command wrote, without decoding or
+    copying it. It can be used as a sequence of lines, which are `memoryview`
+    slices of the output (without their newline). The line offsets are only
+    computed the first time a line is accessed::
+
+        result = s.cat('/tmp/archive.tar.gz').run(binary=True)
+        data = result.stdout.data      # the raw bytes
+        header = result.stdout.view(0, 512)
+        first_line = result.stdout[0]  # a memoryview
+
+    The data may also be a memory-mapped file (see `SpillBuffer`).
+    """
+
+    def __init__(self, data=b''):
+
+        self.data = data
+        self._start = 0
+        self._end = len(data)
+        self._starts = None
+
+    def __bytes__(self):
+
+        return bytes(self.data)
+
+    def __bool__(self):
+
+        return self._end > self._start
+
+    def __len__(self):
+
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Line index out of range.")
+
+        start, end = self.offsets[index], self.offsets[index + 1]
+        if end > start and self.data[end - 1:end] == b'\n':
+            end -= 1
+        return self.view(start, end)
+
+    def __iter__(self):
+
+        for index in range(len(self)):
+            yield self[index]
+
+    def __eq__(self, other):
+
+        if isinstance(other, BinaryOutput):
+            return self.data == other.data
+        return NotImplemented
+
+    def __ne__(self, other):
+
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __repr__(self):
+
+        return '<%s: %d bytes>' % (self.__class__.__name__, len(self.data))
+
+    @property
+    def offsets(self):
+        """
+        Returns the offset of the start of every line, followed by the offset
+        of the end of the output. Line `i` spans `offsets[i]` to
+        `offsets[i + 1]`.
+        """
+        if self._starts is None:
+            starts = array('q', [self._start]) if self else array('q')
+            find = self.data.find
+            position = find(b'\n', self._start, self._end)
+            while position != -1 and position + 1 < self._end:
+                starts.append(position + 1)
+                position = find(b'\n', position + 1, self._end)
+            starts.append(self._end)
+            self._starts = starts
+        return self._starts
+
+    def view(self, start=0, end=None):
+        """
+        Returns a `memoryview` of the output from `start` to `end`, without
+        copying it.
+        """
+        return memoryview(self.data)[start:end]
+
+    def lines(self, encoding='utf-8', errors='replace'):
+        """
+        Returns the lines of the output, decoded.
+        """
+        return [bytes(line).decode(encoding, errors) for line in self]
+
+
+class TextOutput(BinaryOutput):
+    """
+    Output that is too large to be kept in memory (see `SpillBuffer`), used as
+    a sequence of lines. Like the output of any other command, leading and
+    trailing whitespace is removed, but lines are only decoded when they are
+    accessed.
+    """
+
+    def __init__(self, data, encoding=None):
+
+        super(TextOutput, self).__init__(data)
+        self.encoding = encoding or output_encoding()
+
+        while self._start < self._end and self.data[self._start:self._start + 1] in WHITESPACE:
+            self._start += 1
+        while self._end > self._start and self.data[self._end - 1:self._end] in WHITESPACE:
+            self._end -= 1
+
+    def __getitem__(self, index):
+
+        if isinstance(index, slice):
+            return super(TextOutput, self).__getitem__(index)
+        return bytes(super(TextOutput, self).__getitem__(index)).decode(self.encoding).rstrip('\r')
+
+    def __eq__(self, other):
+
+        if isinstance(other, list):
+            return list(self) == other
+        return super(TextOutput, self).__eq__(other)
+
+    def lines(self, encoding=None, errors='strict'):
+        """
+        Returns the lines of the output.
+        """
+        return list(self)
+
+
+class SpillBuffer(Base):
+    """
+    Collects the output of a pipe in memory, and moves it to a temporary file
+    once it grows past `max_memory` bytes.
+    """
+
+    def __init__(self, max_memory):
+
+        self.max_memory = max_memory
+        self.size = 0
+        self._chunks = []
+        self._file = None
+
+    @property
+    def spilled(self):
+        """
+        Returns True if the output was moved to a temporary file.
+        """
+        return self._file is not None
+
+    def write(self, data):
+
+        self.size += len(data)
+        if not self.spilled and self.size > self.max_memory:
+            import tempfile
+            self._file = tempfile.TemporaryFile(prefix='sultan-')
+            self._file.writelines(self._chunks)
+            self._chunks = None
+
+        if self.spilled:
+            self._file.write(data)
+        else:
+            self._chunks.append(data)
+
+    def getvalue(self):
+        """
+        Returns the output as `bytes`, or as a read-only memory map of the
+        temporary file if it was spilled.
+        """
+        if not self.spilled:
+            return b''.join(self._chunks)
+
+        self._file.flush()
+        data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._file.close()
+        return data
@@ -0,0 +1,116 @@
+"""
+Contexts, compiled into plans.
+
+A `ContextPlan` resolves everything that a context (see `Sultan.load`) does to
+the commands run in it once: the user, the environment, the executable, and
+the text that is wrapped around every chain of commands (for 'cwd', 'src',
+'sudo' and SSH). `Sultan` compiles its plan when it is loaded and entered, and
+applies it to every command it runs::
+
+    with Sultan.load(cwd='/tmp', user='hodor', hostname='myserver.com') as s:
+        print(s.plan.wrap('ls -lah;'))  # ssh hodor@myserver.com 'cd /tmp && ls -lah;'
+
+Plans don't change; if the context changes, compile a new plan.
+"""
+
+import getpass
+import os
+
+from .core import Base
+
+__all__ = ['ContextPlan', 'SHELL_CONTEXT', 'shell_command']
+
+# context that wraps the command in something only the shell can run
+SHELL_CONTEXT = ('sudo', 'hostname', 'src', 'executable')
+
+
+class ContextPlan(Base):
+    """
+    What a context does to the commands run in it. The plan of no context
+    (`ContextPlan(None)`) runs commands as they are, in the environment of
+    this process.
+
+    - `prefix`, `suffix`: the text wrapped around a chain of commands.
+    - `user`: the user the commands run as.
+    - `env`: the environment of the commands (None for the environment of this
+      process).
+    - `cwd`, `executable`, `hostname`: as in the context.
+    - `needs_shell`: True if the wrapped commands can only run through the
+      shell.
+    """
+
+    def __init__(self, context):
+
+        if context is None:
+            values = {'env': os.environ}
+            context = {}
+        else:
+            values = {'env': context.get('env', {})}
+
+        user = context.get('user')
+        values.update({
+            'user': user,
+            'cwd': context.get('cwd'),
+            'executable': context.get('executable'),
+            'hostname': context.get('hostname'),
+            'needs_shell': any(context.get(key) for key in SHELL_CONTEXT),
+        })
+
+        prefix, suffix = '', ''
+
+        # update with 'cwd' context
+        if context.get('cwd'):
+            prefix = "cd %s && " % context['cwd'] + prefix
+
+        # update with 'src' context
+        if context.get('src'):
+            prefix = "source %s && " % context['src'] + prefix
+
+        # update with 'sudo' context
+        if context.get('sudo'):
+            current_user = getpass.getuser()
+            if user != current_user:
+                prefix, suffix = "sudo su - %s -c '" % user + prefix, suffix + "'"
+            elif current_user == 'root':
+                prefix, suffix = "su - %s -c '" % user + prefix, suffix + "'"
+            else:
+                prefix = "sudo " + prefix
+
+        # if we have to ssh, prepare for the SSH command
+        ssh_config = context.get('ssh_config')
+        control_master = context.get('control_master')
+        if control_master:
+            ssh_config = ' '.join(filter(None, (control_master.options, ssh_config)))
+        if context.get('hostname'):
+            ssh_config = ' %s ' % ssh_config if ssh_config else ' '
+            prefix = "ssh%s%s@%s '" % (ssh_config, user, context['hostname']) + prefix
+            suffix = suffix + "'"
+
+        values.update({'prefix': prefix, 'suffix': suffix})
+        self.__dict__.update(values)
+
+    def __setattr__(self, attr, value):
+
+        raise AttributeError("Plans can't be changed, compile a new one instead.")
+
+    def wrap(self, chain):
+        """
+        Returns `chain` (a chain of commands, as a string), wrapped in what the
+        context does to it.
+        """
+        return self.prefix + chain + self.suffix
+
+    def __repr__(self):
+
+        return '<ContextPlan: %r>' % self.wrap('...')
+
+
+def shell_command(context):
+    """
+    Returns the command line that starts a shell in `context`, to run many
+    chains of commands in it (see `Session` and `Batch`). 'cwd' and 'src'
+    aren't applied: the shell applies them itself, once for all chains.
+    """
+    shell = 'sh' if context and context.get('hostname') else (context or {}).get('executable') or '/bin/sh'
+    plan = ContextPlan(dict(context, cwd=None, src=None) if context else None)
+    return plan.wrap(shell + ';')
@@ -0,0 +1,223 @@
+"""
+Processes that account for the resources they used.
+
+Sultan starts commands with `Process`, a `subprocess.Popen` that reaps the
+command itself, with `os.wait4` instead of `os.waitpid`. Along with the exit code, this
+returns the resources the command used, which are kept as a `ResourceUsage`::
+
+    result = s.tar('-czf', '/tmp/backup.tar.gz', '/var/www').run()
+    print(result.timing.duration, result.rusage.user_time, result.rusage.max_rss)
+"""
+
+import os
+import subprocess
+import threading
+import time
+
+from .core import Base
+from .output import decode
+from .streams import read_pipes
+
+__all__ = ['Process', 'ResourceUsage', 'Timing']
+
+
+class ResourceUsage(Base):
+    """
+    The resources used by a command (and by the children it waited for), as
+    reported by `os.wait4`:
+
+    - `user_time`, `system_time`: the CPU time, in seconds.
+    - `max_rss`: the maximum resident set size (in kilobytes on Linux, in
+      bytes on macOS).
+    - `voluntary_switches`, `involuntary_switches`: the context switches.
+    """
+
+    def __init__(self, user_time=0.0, system_time=0.0, max_rss=0, voluntary_switches=0, involuntary_switches=0):
+
+        self.user_time = user_time
+        self.system_time = system_time
+        self.max_rss = max_rss
+        self.voluntary_switches = voluntary_switches
+        self.involuntary_switches = involuntary_switches
+
+    @classmethod
+    def from_rusage(cls, rusage):
+
+        return cls(rusage.ru_utime, rusage.ru_stime, rusage.ru_maxrss, rusage.ru_nvcsw, rusage.ru_nivcsw)
+
+    @classmethod
+    def combine(cls, usages):
+        """
+        Returns the usage of commands that ran at the same time, i.e.: the
+        stages of a pipeline. Times and switches add up, `max_rss` is the
+        largest of them.
+        """
+        usages = [usage for usage in usages if usage is not None]
+        if not usages:
+            return None
+
+        return cls(sum(usage.user_time for usage in usages),
+                   sum(usage.system_time for usage in usages),
+                   max(usage.max_rss for usage in usages),
+                   sum(usage.voluntary_switches for usage in usages),
+                   sum(usage.involuntary_switches for usage in usages))
+
+    @property
+    def cpu_time(self):
+
+        return self.user_time + self.system_time
+
+    def __repr__(self):
+
+        return '<ResourceUsage: user=%.3fs system=%.3fs max_rss=%d>' % (
+            self.user_time, self.system_time, self.max_rss)
+
+
+class Timing(Base):
+    """
+    When a command ran:
+
+    - `started`, `ended`: the wall-clock time the command was started and
+      reaped, as seconds since the epoch.
+    - `duration`: how long the command ran, in seconds.
+    - `time_to_first_byte`: how long it took for the command to write its
+      first output, in seconds, or None if it wrote nothing.
+    """
+
+    def __init__(self, started, duration=None, time_to_first_byte=None):
+
+        self.started = started
+        self.duration = duration
+        self.time_to_first_byte = time_to_first_byte
+
+    @property
+    def ended(self):
+
+        return None if self.duration is None else self.started + self.duration
+
+    def __repr__(self):
+
+        return '<Timing: duration=%s time_to_first_byte=%s>' % (self.duration, self.time_to_first_byte)
+
+
+class Process(subprocess.Popen):
+    """
+    A `subprocess.Popen` that records when it was started, when it wrote its
+    first output (`first_output`, see `communicate`, which also calls
+    `on_first_output()` then) and when it was reaped, and the resources it
+    used (`rusage`), once it is reaped.
+
+    `poll()` and `wait()` reap the command themselves, with `os.wait4`.
+    """
+
+    def __init__(self, *args, **kwargs):
+
+        self.started = time.time()
+        self.clock = time.monotonic()
+        self.first_output = None
+        self.on_first_output = None
+        self.duration = None
+        self.rusage = None
+        self._output = {'stdout': [], 'stderr': []}
+        self._reap_lock = threading.Lock()
+
+        # what the output is decoded with, in text mode (see `communicate`)
+        self._encoding = None
+        if any(kwargs.get(key) for key in ('universal_newlines', 'text', 'encoding', 'errors')):
+            self._encoding = (kwargs.get('encoding'), kwargs.get('errors') or 'strict')
+        super(Process, self).__init__(*args, **kwargs)
+
+    def communicate(self, input=None, timeout=None):
+        """
+        Like `subprocess.Popen.communicate`, but records when the first output
+        arrives. Only stdout and stderr pipes, without `input`, are read this
+        way.
+        """
+        if input is not None or not (self.stdout and self.stderr):
+            return super(Process, self).communicate(input, timeout)
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        output = self._output
+
+        def on_data(name, data):
+            if self.first_output is None:
+                self.first_output = time.monotonic()
+                if self.on_first_output:
+                    self.on_first_output()
+            output[name].append(data)
+
+        if self.stdin and not self.stdin.closed:
+            try:
+                self.stdin.close()
+            except BrokenPipeError:
+                pass
+
+        pipes = {'stdout': self.stdout, 'stderr': self.stderr}
+        try:
+            read_pipes(pipes, on_data, timeout)
+        except subprocess.TimeoutExpired:
+            raise subprocess.TimeoutExpired(self.args, timeout)
+        self.wait(None if deadline is None else max(deadline - time.monotonic(), 0))
+
+        stdout, stderr = b''.join(output['stdout']), b''.join(output['stderr'])
+        if self._encoding:
+            stdout, stderr = decode(stdout, *self._encoding), decode(stderr, *self._encoding)
+        for pipe in pipes.values():
+            pipe.close()
+        return stdout, stderr
+
+    def poll(self):
+        """
+        Reaps the command if it exited, and returns its exit code (or None if
+        it's still running).
+        """
+        if self.returncode is None and self._reap_lock.acquire(False):
+            try:
+                self._reap(os.WNOHANG)
+            finally:
+                self._reap_lock.release()
+        return self.returncode
+
+    def wait(self, timeout=None):
+        """
+        Waits for the command to exit, reaps it, and returns its exit code.
+        Raises `subprocess.TimeoutExpired` if it doesn't exit within `timeout`
+        seconds.
+        """
+        if timeout is None:
+            with self._reap_lock:
+                self._reap(0)
+            return self.returncode
+
+        deadline = time.monotonic() + timeout
+        delay = 0.0005
+        while self.poll() is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise subprocess.TimeoutExpired(self.args, timeout)
+            delay = min(delay * 2, remaining, 0.05)
+            time.sleep(delay)
+        return self.returncode
+
+    def _reap(self, options):
+        """
+        Calls `os.wait4` for the command (with `_reap_lock` held), and records
+        its exit code, duration and resource usage once it exited.
+        """
+        if self.returncode is not None:
+            return
+
+        try:
+            if hasattr(os, 'wait4'):
+                pid, status, rusage = os.wait4(self.pid, options)
+            else:
+                (pid, status), rusage = os.waitpid(self.pid, options), None
+        except ChildProcessError:
+            # mirror `subprocess`: the child is gone, and its status with it
+            pid, status, rusage = self.pid, 0, None
+
+        if pid:
+            self.duration = time.monotonic() - self.clock
+            if rusage is not None:
+                self.rusage = ResourceUsage.from_rusage(rusage)
+            self.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
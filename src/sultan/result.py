@@ -1,12 +1,15 @@
+import mmap
+import os
+import signal
 import subprocess
-import sys
 import time
-import traceback
 
-from queue import Queue
 from sultan.core import Base
 from sultan.echo import Echo
-from threading import Thread
+from sultan.hooks import emit
+from sultan.output import BinaryOutput, SpillBuffer, TextOutput, decode, iter_lines
+from sultan.process import Timing
+from sultan.streams import Reactor, read_pipes
 
 
 class Result(Base):
@@ -14,36 +17,50 @@ class Result(Base):
     Class that encompasses the result of a POpen command.
     """
 
-    def __init__(self, process, commands, context, streaming=False, exception=None, halt_on_nonzero=False):
+    def __init__(self, process, commands, context, streaming=False, exception=None, halt_on_nonzero=False, binary=False,
+                 max_memory=None, timeout=None, run_id=None):
         super(Result, self).__init__()
         self._process = process
         self._commands = commands
         self._context = context
         self._exception = exception
-        self.__echo = Echo()
+        self.__echo = Echo(sampler=context[0].get('log_sampler') if context else None)
         self._streaming = streaming
+        self._binary = binary
         self.rc = None
+        self.timed_out = False
+        self._timeout = timeout
+        self._timer = None
+        self._first_output = None
+        self._run_id = run_id
         self._halt_on_nonzero=halt_on_nonzero
-        
-        if process and streaming:
-            self.is_complete = False
-            self.__stdout = Queue()
-            self.__stderr = Queue()
-            self.__stdin = Queue()
 
-            self._stdout_t = Thread(target=self.read_output, args=(process.stdout, self.__stdout))
-            self._stderr_t = Thread(target=self.read_output, args=(process.stderr, self.__stderr))
-            self._stdin_t = Thread(target=self.write_input)
-            self._wait_t = Thread(target=self.wait_on_process)
+        if process is None:
+            # there's no process to wait for: the result is completed later
+            # (see `pending`), or its process couldn't be started
+            self.is_complete = exception is not None
+            self.__raw, self.__lines = {'stdout': None, 'stderr': None}, {}
+
+        elif streaming:
+            process.on_first_output = self._on_first_output
+            self.is_complete = False
+            from queue import Queue
+            self.__queues = {'stdout': Queue(), 'stderr': Queue()}
 
-            for t in (self._stdout_t, self._stderr_t, self._stdin_t, self._wait_t):
-                t.daemon = True
-                t.start()
+            pipes = {'stdout': process.stdout, 'stderr': process.stderr}
+            reactor = Reactor.instance()
+            if timeout is not None:
+                self._timer = reactor.call_later(timeout, self._on_timeout)
+            reactor.register(process, pipes, self._on_line, self._on_exit, binary=binary)
 
         else:
+            process.on_first_output = self._on_first_output
             self.is_complete = True
             try:
-                stdout, stderr = process.communicate()
+                if max_memory is None:
+                    stdout, stderr = self._communicate(timeout)
+                else:
+                    stdout, stderr = self._spill(max_memory, timeout)
             except:
                 stdout, stderr = None, None
                 
@@ -51,44 +68,191 @@ class Result(Base):
                 self.rc = process.returncode
             except:
                 pass
-            
-            self.__stdout = stdout.strip().splitlines() if stdout else []
-            self.__stderr = stderr.strip().splitlines() if stderr else []
-            
-            if self._halt_on_nonzero and self.rc != 0:
-                self.dump_exception()
-
-
-    def read_output(self, pipe, q):
-        for line in iter(pipe.readline, b''):
-            if line:
-                q.put(line.strip())
-            elif self.is_complete:
-                break
-            else:
-                time.sleep(0.1)
-        pipe.close()
-
-
-    def write_input(self):
-        for line in iter(self.__stdin.get, None):
-            if line.endswith("\n"):
-                self._process.stdin.write(line)
-            else:
-                self._process.stdin.write(line + "\n")
-
-
-    def wait_on_process(self):
-        self.rc = self._process.wait()
-        self.__stdin.put(None)
+
+            self._set_output(stdout, stderr)
+
+    @classmethod
+    def pending(cls, commands, context, halt_on_nonzero=False, binary=False, run_id=None):
+        """
+        Creates a `Result` for commands that run without a dedicated process
+        (i.e.: in a `Batch`). It is completed with `_complete()` once they ran,
+        which emits the `on_exit` hooks of `run_id`.
+        """
+        return cls(None, commands, context, halt_on_nonzero=halt_on_nonzero, binary=binary, run_id=run_id)
+
+    @classmethod
+    def from_output(cls, stdout, stderr, rc, commands, context, halt_on_nonzero=False, binary=False, run_id=None):
+        """
+        Creates a completed `Result` from output that was captured without a
+        dedicated process (i.e.: by a `Session`).
+        """
+        result = cls.pending(commands, context, halt_on_nonzero=halt_on_nonzero, binary=binary, run_id=run_id)
+        result._complete(rc, stdout, stderr)
+        return result
+
+    def _complete(self, rc, stdout, stderr):
+        """
+        Completes a pending `Result` with the exit code and output of its
+        commands.
+        """
+        self.rc = rc
         self.is_complete = True
-        for t in (self._stdout_t, self._stderr_t, self._stdin_t):
-            t.join()
-        if self._halt_on_nonzero and self.rc != 0:
+        self._set_output(stdout, stderr)
+
+    def _communicate(self, timeout=None):
+        """
+        Captures stdout and stderr with `communicate()`. If the process doesn't
+        complete within `timeout` seconds, it is cancelled, and the output it
+        wrote until then is returned.
+        """
+        try:
+            return self._process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self._time_out()
+            return self._process.communicate()
+
+    def _spill(self, max_memory, timeout=None):
+        """
+        Captures stdout and stderr like `communicate()`, but moves each of them
+        to a temporary file once it grows past `max_memory` bytes. Spilled
+        output is returned as a memory map of its file.
+        """
+        self._process.stdin.close()
+        buffers = {'stdout': SpillBuffer(max_memory), 'stderr': SpillBuffer(max_memory)}
+        pipes = {'stdout': self._process.stdout, 'stderr': self._process.stderr}
+
+        def on_data(name, data):
+            self._on_first_output()
+            buffers[name].write(data)
+
+        try:
+            read_pipes(pipes, on_data, timeout)
+        except subprocess.TimeoutExpired:
+            self._time_out()
+            read_pipes(pipes, on_data)
+        for pipe in pipes.values():
+            pipe.close()
+        self._process.wait()
+
+        output = []
+        for name in ('stdout', 'stderr'):
+            data = buffers[name].getvalue()
+            if not (self._binary or buffers[name].spilled):
+                data = decode(data)
+            output.append(data)
+        return output
+
+    def _set_output(self, stdout, stderr):
+        """
+        Stores the captured stdout and stderr of a completed process. They are
+        only split into lines when they are accessed, i.e.: by the `on_exit`
+        hooks, which are emitted once the output is stored.
+        """
+        self.__raw = {'stdout': stdout, 'stderr': stderr}
+        self.__lines = {}
+        self._emit_exit()
+
+        if self._halt_on_nonzero and (self.rc != 0 or self.timed_out):
             self.dump_exception()
-        sys.exit()
-        
-                
+
+    def __get_lines(self, name):
+        """
+        Returns the lines of stdout or stderr, splitting them on first access.
+        """
+        if name not in self.__lines:
+            self.__lines[name] = self.__make_output(self.__raw.pop(name))
+        return self.__lines[name]
+
+    def __iter_lines(self, name):
+
+        if self._streaming:
+            from queue import Empty
+            queue = self.__queues[name]
+            while True:
+                try:
+                    yield queue.get_nowait()
+                except Empty:
+                    return
+        elif name in self.__lines or not isinstance(self.__raw[name], str):
+            for line in self.__get_lines(name):
+                yield line
+        else:
+            for line in iter_lines(self.__raw[name].strip()):
+                yield line
+
+    def __has_output(self, name):
+
+        if self._streaming:
+            return True
+        elif name in self.__lines:
+            return bool(self.__lines[name])
+        else:
+            return bool(self.__raw[name])
+
+    def __make_output(self, data):
+
+        if isinstance(data, mmap.mmap):
+            return BinaryOutput(data) if self._binary else TextOutput(data)
+        elif self._binary:
+            return BinaryOutput(data or b'')
+        else:
+            return data.strip().splitlines() if data else []
+
+    def _on_line(self, name, line):
+        """
+        Called by the `Reactor` for every line of stdout and stderr.
+        """
+        self._on_first_output()
+        self.__queues[name].put(line.strip())
+
+    def _on_first_output(self):
+        """
+        Called when the first output of the command arrives.
+        """
+        if self._first_output is None:
+            self._first_output = time.monotonic()
+            self._emit('on_first_output')
+
+    def _emit(self, name):
+        """
+        Emits a hook event, for commands that were built with a `run_id`.
+        """
+        if self._run_id is not None:
+            context = self._context[-1] if self._context else {}
+            emit(name, context, run_id=self._run_id, commands=self._commands, result=self,
+                 exception=self._exception)
+
+    def _emit_exit(self):
+
+        self._emit('on_exit')
+        if not self.is_success:
+            self._emit('on_error')
+
+    def _on_timeout(self):
+        """
+        Called by the `Reactor` once the timeout of a streaming process expired.
+        """
+        if not self.is_complete:
+            self._time_out()
+
+    def _time_out(self):
+
+        self.timed_out = True
+        self._exception = subprocess.TimeoutExpired(self._commands, self._timeout)
+        self.cancel()
+
+    def _on_exit(self, rc):
+        """
+        Called by the `Reactor` once the process has completed.
+        """
+        if self._timer:
+            self._timer.cancel()
+        self.rc = rc
+        self.is_complete = True
+        self._emit_exit()
+        if self._halt_on_nonzero and (self.rc != 0 or self.timed_out):
+            self.dump_exception()
+
     def dump_exception(self):
         if not self._exception:
             try:
@@ -132,21 +296,27 @@ class Result(Base):
         echo_debug_info('src')
         
     def __str__(self):
+        if isinstance(self.stdout, BinaryOutput):
+            return '\n'.join(self.stdout.lines())
         return '\n'.join(self.stdout)
 
     def __format_line(self, msg):
 
+        if not isinstance(msg, str):
+            msg = bytes(msg).decode('utf-8', 'replace')
         return '| %s' % msg
 
     def __format_lines_error(self, lines):
 
         for line in lines:
-            self.__echo.critical(self.__format_line(line))
+            self.__echo.stderr(self.__format_line(line))
+        self.__echo.summarize()
 
     def __format_lines_info(self, lines):
 
         for line in lines:
-            self.__echo.info(self.__format_line(line))
+            self.__echo.stdout(self.__format_line(line))
+        self.__echo.summarize()
 
     @property
     def stdout(self):
@@ -154,16 +324,8 @@ class Result(Base):
         Converts stdout string to a list.
         """
         if self._streaming:
-            stdout = []
-            while not self.__stdout.empty():
-                try:
-                    line = self.__stdout.get_nowait()
-                    stdout.append(line)
-                except:
-                    pass
-        else:
-            stdout =  self.__stdout
-        return stdout
+            return list(self.__iter_lines('stdout'))
+        return self.__get_lines('stdout')
 
     @property
     def stderr(self):
@@ -171,23 +333,87 @@ class Result(Base):
         Converts stderr string to a list.
         """
         if self._streaming:
-            stderr = []
-            while not self.__stderr.empty():
-                try:
-                    line = self.__stderr.get_nowait()
-                    stderr.append(line)
-                except:
-                    pass
-        else:
-            stderr = self.__stderr
-        return stderr
+            return list(self.__iter_lines('stderr'))
+        return self.__get_lines('stderr')
+
+    def iter_stdout(self):
+        """
+        Yields the lines of stdout, without building a list of all of them.
+        """
+        return self.__iter_lines('stdout')
+
+    def iter_stderr(self):
+        """
+        Yields the lines of stderr, without building a list of all of them.
+        """
+        return self.__iter_lines('stderr')
 
     def stdin(self, line):
         """
         Sends input to stdin.
         """
         if self._streaming:
-            self.__stdin.put(line)
+            if not line.endswith("\n"):
+                line += "\n"
+            self._process.stdin.write(line)
+            self._process.stdin.flush()
+
+    def cancel(self):
+        """
+        Kills the command, if it's still running. Commands that were run with
+        `streaming` or a `timeout` run in a process group of their own, and
+        every process in the group is killed: along with the command, this
+        kills the processes it started (i.e.: `ssh`, the commands run by
+        `sudo`, or the rest of a chain run by the shell).
+        """
+        # the stages of a pipeline are killed from the last one, so that none
+        # of them sees the end of its input and exits on its own first
+        for process in reversed(getattr(self._process, 'processes', [self._process])):
+            if process is None or process.poll() is not None:
+                continue
+            try:
+                if os.getpgid(process.pid) == process.pid:
+                    os.killpg(process.pid, signal.SIGKILL)
+                else:
+                    process.kill()
+            except OSError:
+                pass
+
+    @property
+    def timing(self):
+        """
+        Returns the `Timing` of the command: when it was started and reaped,
+        and how long it took to write its first output. Returns None if the
+        command wasn't run by Sultan's own process (i.e.: in a `Session`).
+        """
+        clock = getattr(self._process, 'clock', None)
+        if clock is None:
+            return None
+
+        first_output = self._first_output or self._process.first_output
+        if first_output is not None:
+            first_output -= clock
+        return Timing(self._process.started, self._process.duration, first_output)
+
+    @property
+    def rusage(self):
+        """
+        Returns the `ResourceUsage` of the command (CPU time, maximum resident
+        set size, and context switches), once it was reaped.
+        """
+        return getattr(self._process, 'rusage', None)
+
+    @property
+    def pipestatus(self):
+        """
+        Returns the exit codes of every command in a pipeline, like `$PIPESTATUS`
+        in Bash. Only commands that were run without a shell (see
+        `sultan.engine.Pipeline`) report more than one exit code.
+        """
+        returncodes = getattr(self._process, 'returncodes', None)
+        if returncodes is not None:
+            return list(returncodes)
+        return [self.rc] if self.rc is not None else []
 
     @property
     def traceback(self):
@@ -195,6 +421,7 @@ class Result(Base):
         Converts traceback string to a list.
         """
         if self._exception:
+            import traceback
             return traceback.format_exc().split("\n")
         else:
             return []
@@ -203,9 +430,9 @@ class Result(Base):
     def is_success(self):
         """
         Returns if the result of the command was a success.
-        True for success, False for failure.
+        True for success, False for failure. Commands that timed out failed.
         """
-        return self.is_complete and self.rc == 0
+        return self.is_complete and self.rc == 0 and not self.timed_out
 
     @property
     def is_failure(self):
@@ -213,7 +440,7 @@ class Result(Base):
         Returns if the result of the command was a failure.
         True for failure, False for succes.
         """
-        return self.is_complete and not self.rc == 0
+        return self.is_complete and (not self.rc == 0 or self.timed_out)
 
     @property
     def has_exception(self):
@@ -227,7 +454,7 @@ class Result(Base):
         Prints the stdout to console - if there is any stdout, otherwise does nothing.
         :param always_print:   print the stdout, even if there is nothing in the buffer (default: false)
         """
-        if self.__stdout or always_print:
+        if self.__has_output('stdout') or always_print:
             self.__echo.info("--{ STDOUT }---" + "-" * 100)
             self.__format_lines_info(self.stdout)
             self.__echo.info("---------------" + "-" * 100)
@@ -237,7 +464,7 @@ class Result(Base):
         Prints the stderr to console - if there is any stdout, otherwise does nothing.
         :param always_print:   print the stderr, even if there is nothing in the buffer (default: false)
         """
-        if self.__stderr or always_print:
+        if self.__has_output('stderr') or always_print:
             self.__echo.critical("--{ STDERR }---" + "-" * 100)
             self.__format_lines_error(self.stderr)
             self.__echo.critical("---------------" + "-" * 100)
@@ -0,0 +1,210 @@
+"""
+Persistent shell sessions.
+
+A `Session` starts one shell (locally, or on the remote host when Sultan is
+loaded with a `hostname`) and sends every command to it, instead of starting a
+new shell per command. Shell state like the working directory, variables and
+sourced files persists between commands::
+
+    with Sultan.load(cwd='/tmp') as s:
+        with s.session() as session:
+            session.cd('/var/log').run()
+            result = session.ls('-lah').run()  # runs in /var/log
+
+Each command is followed by marker lines on stdout and stderr, which separate
+its output (and exit code) from the output of the next command.
+"""
+
+import os
+import re
+import selectors
+import subprocess
+import uuid
+
+from .api import Sultan
+from .hooks import emit, new_id
+from .output import decode, output_encoding
+from .plan import shell_command
+from .result import Result
+
+__all__ = ['Session']
+
+
+def wrap(commands, marker):
+    """
+    Returns the script that runs `commands` in a shell, followed by `marker`
+    and the exit code on stdout, and by `marker` on stderr.
+    """
+    # stdin is closed for the command so it can't consume the script
+    return '{ %s\n} < /dev/null\nprintf "\\n%s %%d\\n" "$?"\nprintf "\\n%s\\n" >&2\n' % (
+        commands, marker, marker)
+
+
+class Session(Sultan):
+    """
+    Runs commands in a single, long-lived shell.
+    """
+
+    def __init__(self, context=None):
+
+        super(Session, self).__init__(context=context)
+        self._process = None
+        self._id = uuid.uuid4().hex
+        self._count = 0
+
+    def __enter__(self):
+
+        self.open()
+        return self
+
+    def __exit__(self, type, value, traceback):
+
+        self.close()
+
+    def __str__(self):
+        """
+        Returns the chained commands that were built, as they are sent to the
+        shell. The context is applied once, when the shell is started.
+        """
+        return self._build_chain()
+
+    @property
+    def is_open(self):
+
+        return self._process is not None
+
+    def open(self):
+        """
+        Starts the shell, if it isn't running already.
+        """
+        if self.is_open:
+            return self
+
+        context = self.current_context
+        # 'cwd' and 'src' are applied inside the shell, so they persist
+        env = self.plan.env
+        self._process = subprocess.Popen(shell_command(context if self._context else None),
+                                         bufsize=0,
+                                         shell=True,
+                                         env=env,
+                                         stdin=subprocess.PIPE,
+                                         stdout=subprocess.PIPE,
+                                         stderr=subprocess.PIPE)
+
+        try:
+            if context.get('src'):
+                self._execute('. %s;' % context['src'], halt_on_nonzero=True)
+            if context.get('cwd'):
+                self._execute('cd %s;' % context['cwd'], halt_on_nonzero=True)
+        except Exception:
+            self.close()
+            raise
+
+        return self
+
+    def close(self):
+        """
+        Stops the shell, once it has finished running the commands sent to it.
+        """
+        if not self.is_open:
+            return
+
+        process, self._process = self._process, None
+        try:
+            process.stdin.close()
+        except (IOError, OSError):
+            pass
+        process.wait()
+        process.stdout.close()
+        process.stderr.close()
+
+    def run(self, halt_on_nonzero=True, quiet=False, q=False, streaming=False, binary=False):
+        """
+        Runs the commands that were built in the session's shell. The shell
+        is started if it isn't running.
+        """
+        if streaming:
+            raise ValueError("Session does not support 'streaming'.")
+
+        commands = str(self)
+        if not (quiet or q):
+            self._echo.cmd(commands)
+
+        run_id = new_id()
+        emit('on_build', self.current_context, run_id=run_id, commands=commands, command=self._command_name())
+        try:
+            self.open()
+            emit('on_spawn', self.current_context, run_id=run_id, commands=commands, pid=self._process.pid)
+            result = self._execute(commands, binary=binary, run_id=run_id)
+        except Exception as e:
+            emit('on_error', self.current_context, run_id=run_id, commands=commands, exception=e)
+            raise
+        finally:
+            self.clear()
+
+        if halt_on_nonzero and result.rc != 0:
+            result._halt_on_nonzero = True
+            result.dump_exception()
+        return result
+
+    def run_many(self, chains, **kwargs):
+        """
+        Not supported: a session runs its commands one at a time.
+        """
+        raise ValueError("Session does not support 'run_many', it runs one command at a time.")
+
+    def _execute(self, commands, halt_on_nonzero=False, binary=False, run_id=None):
+        """
+        Sends commands to the shell, and waits for their markers. The result
+        emits the `on_exit` hooks of `run_id`.
+        """
+        self._count += 1
+        marker = '__SULTAN_%s_%d__' % (self._id, self._count)
+
+        self._process.stdin.write(wrap(commands, marker).encode(output_encoding()))
+
+        stdout_marker = re.compile(('\n%s (\\d+)\n$' % marker).encode())
+        stderr_marker = re.compile(('\n%s\n$' % marker).encode())
+        tail = len(marker) + 16
+
+        stdout_fd = self._process.stdout.fileno()
+        stderr_fd = self._process.stderr.fileno()
+        streams = {
+            stdout_fd: (bytearray(), stdout_marker),
+            stderr_fd: (bytearray(), stderr_marker),
+        }
+        matches = {}
+        with selectors.DefaultSelector() as selector:
+            for fd in streams:
+                selector.register(fd, selectors.EVENT_READ)
+
+            while selector.get_map():
+                for key, _ in selector.select():
+                    data = os.read(key.fd, 65536)
+                    if not data:
+                        selector.unregister(key.fd)
+                        continue
+
+                    buffer, pattern = streams[key.fd]
+                    buffer.extend(data)
+                    match = pattern.search(bytes(buffer[-tail:]))
+                    if match:
+                        matches[key.fd] = match
+                        del buffer[len(buffer) - len(match.group(0)):]
+                        selector.unregister(key.fd)
+
+        stdout, stderr = streams[stdout_fd][0], streams[stderr_fd][0]
+        if stdout_fd in matches:
+            rc = int(matches[stdout_fd].group(1))
+        else:
+            # the shell exited (i.e.: the command called 'exit')
+            rc = self._process.wait()
+            self.close()
+
+        if binary:
+            stdout, stderr = bytes(stdout), bytes(stderr)
+        else:
+            stdout, stderr = decode(stdout), decode(stderr)
+
+        return Result.from_output(stdout, stderr, rc, commands, self._context,
+                                  halt_on_nonzero=halt_on_nonzero, binary=binary, run_id=run_id)
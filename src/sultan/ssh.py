@@ -0,0 +1,94 @@
+"""
+SSH connection multiplexing.
+
+When Sultan is loaded with `multiplex=True` and a `hostname`, every command
+run in the `with` block goes through a single SSH ControlMaster connection to
+the host, instead of paying for a new connection and handshake per command::
+
+    with Sultan.load(hostname='myserver.com', multiplex=True) as s:
+        s.uptime().run()  # opens the master connection
+        s.df('-h').run()  # reuses it
+
+The master is shut down when the `with` block exits.
+"""
+
+import os
+import shlex
+import shutil
+import subprocess
+import tempfile
+import threading
+
+from .core import Base
+
+__all__ = ['ControlMaster']
+
+
+class ControlMaster(Base):
+    """
+    A persistent SSH connection, shared by every context that runs commands on
+    the same host, as the same user, with the same SSH configuration.
+    """
+
+    # how long an idle master is kept alive by ssh, in case it is never closed
+    persist = '10m'
+
+    _masters = {}
+    _lock = threading.Lock()
+
+    def __init__(self, user, hostname, ssh_config=''):
+
+        self.user = user
+        self.hostname = hostname
+        self.ssh_config = ssh_config
+        self.references = 0
+        self._directory = tempfile.mkdtemp(prefix='sultan-ssh-')
+        self.control_path = os.path.join(self._directory, 'control')
+
+    @classmethod
+    def acquire(cls, user, hostname, ssh_config=''):
+        """
+        Returns the master for the given connection, creating it if needed.
+        Every call must be paired with a call to `release`.
+        """
+        key = (user, hostname, ssh_config)
+        with cls._lock:
+            master = cls._masters.get(key)
+            if master is None:
+                master = cls._masters[key] = cls(user, hostname, ssh_config)
+            master.references += 1
+        return master
+
+    def release(self):
+        """
+        Releases a reference to the master, and closes it once nobody uses it.
+        """
+        key = (self.user, self.hostname, self.ssh_config)
+        with self._lock:
+            self.references -= 1
+            if self.references > 0:
+                return
+            if self._masters.get(key) is self:
+                del self._masters[key]
+        self.close()
+
+    @property
+    def options(self):
+        """
+        Returns the options that make `ssh` use (or start) the master.
+        """
+        return '-o ControlMaster=auto -o ControlPath=%s -o ControlPersist=%s' % (
+            self.control_path, self.persist)
+
+    def close(self):
+        """
+        Shuts down the master connection, if one was started.
+        """
+        if os.path.exists(self.control_path):
+            command = ['ssh'] + shlex.split(self.ssh_config) + [
+                '-o', 'ControlPath=%s' % self.control_path,
+                '-O', 'exit',
+                '%s@%s' % (self.user, self.hostname)]
+            with open(os.devnull, 'w') as devnull:
+                subprocess.call(command, stdout=devnull, stderr=devnull)
+        shutil.rmtree(self._directory, ignore_errors=True)
@@ -0,0 +1,328 @@
+"""
+Event-driven reading of process output.
+
+Instead of a blocking `readline` per pipe, the pipes of a process are serviced
+from one `selectors` loop, and each line is handed over as soon as it arrives.
+The `Reactor` runs such a loop in a single, process-wide thread that services
+every streaming process at once.
+"""
+
+import codecs
+import heapq
+import itertools
+import os
+import selectors
+import subprocess
+import threading
+import time
+
+from collections import deque
+from .core import Base
+from .output import output_encoding
+
+__all__ = ['LineBuffer', 'Reactor', 'read_pipes']
+
+# how much is read from a pipe at a time
+CHUNK_SIZE = 65536
+
+
+class LineBuffer(Base):
+    """
+    Splits the data read from a pipe into lines, as it arrives. Incomplete
+    lines are kept until the rest of the line (or the end of the pipe) arrives.
+    Bytes that can't be decoded are handled as `errors` says (see
+    `codecs.decode`); by default, they are replaced.
+    """
+
+    def __init__(self, encoding=None, binary=False, errors='replace'):
+
+        if binary:
+            self._decoder = None
+            self._partial = b''
+            self._newline, self._newlines = b'\n', b'\r\n'
+        else:
+            encoding = encoding or output_encoding()
+            self._decoder = codecs.getincrementaldecoder(encoding)(errors)
+            self._partial = ''
+            self._newline, self._newlines = '\n', '\r\n'
+
+    def feed(self, data):
+        """
+        Adds data read from the pipe, and returns the lines it completed.
+        """
+        text = self._partial + (self._decoder.decode(data) if self._decoder else data)
+        lines = text.splitlines(True)
+
+        # a trailing '\r' is kept too, in case it's the first half of a '\r\n'
+        if lines and not lines[-1].endswith(self._newline):
+            self._partial = lines.pop()
+        else:
+            self._partial = self._partial[:0]
+
+        return [line.rstrip(self._newlines) for line in lines]
+
+    def flush(self):
+        """
+        Returns the last line of the pipe, if it didn't end with a newline.
+        """
+        text = self._partial + (self._decoder.decode(b'', final=True) if self._decoder else b'')
+        self._partial = self._partial[:0]
+        return [line.rstrip(self._newlines) for line in text.splitlines(True)]
+
+
+def read_pipes(pipes, on_data, timeout=None):
+    """
+    Reads `pipes` (a mapping of names to pipes) until every one of them is
+    closed, calling `on_data(name, data)` with each chunk as soon as it is read.
+
+    Raises `subprocess.TimeoutExpired` if the pipes aren't closed within
+    `timeout` seconds. Reading can be resumed by calling it again.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    with selectors.DefaultSelector() as selector:
+        for name, pipe in pipes.items():
+            selector.register(pipe.fileno(), selectors.EVENT_READ, name)
+
+        while selector.get_map():
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise subprocess.TimeoutExpired(None, timeout)
+
+            for key, _ in selector.select(remaining):
+                data = os.read(key.fd, CHUNK_SIZE)
+                if data:
+                    on_data(key.data, data)
+                else:
+                    selector.unregister(key.fd)
+
+
+class Reactor(Base):
+    """
+    Reads the pipes of every registered process from one thread, and reaps the
+    processes once their pipes are closed. Processes are reaped as soon as they
+    exit on systems that support `os.pidfd_open`, and by polling otherwise.
+
+    Callbacks are invoked from the reactor's thread, so they must not block.
+    The reactor also runs timers (see `call_later`), i.e.: for timeouts.
+    """
+
+    # how often processes are polled for their exit, without `os.pidfd_open`
+    POLL_INTERVAL = 0.05
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self):
+
+        self._selector = selectors.DefaultSelector()
+        self._registrations = deque()
+        self._polling = []
+        self._timers = []
+        self._sequence = itertools.count()
+        self._wakeup_read, self._wakeup_write = os.pipe()
+        self._selector.register(self._wakeup_read, selectors.EVENT_READ)
+        self._thread = threading.Thread(target=self._run, name='sultan-reactor')
+        self._thread.daemon = True
+        self._thread.start()
+
+    @classmethod
+    def instance(cls):
+        """
+        Returns the process-wide reactor, starting it on first use.
+        """
+        with cls._lock:
+            if cls._instance is None or not cls._instance._thread.is_alive():
+                cls._instance = cls()
+            return cls._instance
+
+    def register(self, process, pipes, on_line, on_exit, encoding=None, binary=False):
+        """
+        Starts reading `pipes` (a mapping of names to pipes) of `process`,
+        calling `on_line(name, line)` for every line, and `on_exit(rc)` once
+        the pipes are closed and the process has exited. Lines are `bytes`
+        when `binary` is True.
+        """
+        self._registrations.append(_Watch(process, pipes, on_line, on_exit, encoding, binary))
+        os.write(self._wakeup_write, b'\0')
+
+    def call_later(self, delay, callback):
+        """
+        Calls `callback()` from the reactor's thread after `delay` seconds, and
+        returns a `_Timer` whose `cancel()` prevents the call.
+        """
+        timer = _Timer(time.monotonic() + delay, callback)
+        self._registrations.append(timer)
+        os.write(self._wakeup_write, b'\0')
+        return timer
+
+    def _run(self):
+
+        while True:
+            timeout = self.POLL_INTERVAL if self._polling else None
+            if self._timers:
+                remaining = max(self._timers[0][0] - time.monotonic(), 0)
+                timeout = remaining if timeout is None else min(timeout, remaining)
+            for key, _ in self._selector.select(timeout):
+                if key.fd == self._wakeup_read:
+                    self._register_pending()
+                    continue
+
+                # an error with one process must not stop the reactor for everyone
+                watch = key.data if isinstance(key.data, _Watch) else key.data[0]
+                try:
+                    if watch is key.data:
+                        self._reap(watch)
+                    else:
+                        self._read(*key.data)
+                except Exception:
+                    self._fail(watch)
+            self._poll()
+            self._fire()
+
+    def _register_pending(self):
+
+        os.read(self._wakeup_read, CHUNK_SIZE)
+        while self._registrations:
+            watch = self._registrations.popleft()
+            if isinstance(watch, _Timer):
+                heapq.heappush(self._timers, (watch.deadline, next(self._sequence), watch))
+                continue
+            for name, pipe in watch.pipes.items():
+                self._selector.register(pipe.fileno(), selectors.EVENT_READ, (watch, name))
+            if not watch.pipes:
+                self._wait(watch)
+
+    def _read(self, watch, name):
+
+        pipe = watch.pipes[name]
+        data = os.read(pipe.fileno(), CHUNK_SIZE)
+        if data:
+            lines = watch.buffers[name].feed(data)
+        else:
+            lines = watch.buffers[name].flush()
+            self._selector.unregister(pipe.fileno())
+            pipe.close()
+            del watch.pipes[name]
+
+        for line in lines:
+            watch.call(watch.on_line, name, line)
+
+        if not watch.pipes:
+            self._wait(watch)
+
+    def _wait(self, watch):
+
+        if hasattr(os, 'pidfd_open'):
+            try:
+                watch.pidfd = os.pidfd_open(watch.process.pid)
+            except OSError:
+                pass
+            else:
+                self._selector.register(watch.pidfd, selectors.EVENT_READ, watch)
+                return
+        self._polling.append(watch)
+
+    def _reap(self, watch):
+
+        self._selector.unregister(watch.pidfd)
+        os.close(watch.pidfd)
+        watch.pidfd = None
+        watch.call(watch.on_exit, watch.process.wait())
+
+    def _poll(self):
+
+        for watch in list(self._polling):
+            try:
+                rc = watch.process.poll()
+            except Exception:
+                self._fail(watch)
+                continue
+            if rc is not None:
+                self._polling.remove(watch)
+                watch.call(watch.on_exit, rc)
+
+    def _fail(self, watch):
+        """
+        Stops watching a process that couldn't be read or reaped: it is
+        killed, and completes with the exit code it has then (or None).
+        """
+        for pipe in watch.pipes.values():
+            try:
+                self._selector.unregister(pipe.fileno())
+            except (KeyError, ValueError):
+                pass
+            pipe.close()
+        watch.pipes.clear()
+        if watch.pidfd is not None:
+            try:
+                self._selector.unregister(watch.pidfd)
+            except (KeyError, ValueError):
+                pass
+            os.close(watch.pidfd)
+            watch.pidfd = None
+        if watch in self._polling:
+            self._polling.remove(watch)
+
+        rc = None
+        try:
+            if watch.process.poll() is None:
+                watch.process.kill()
+            rc = watch.process.wait()
+        except Exception:
+            pass
+        watch.call(watch.on_exit, rc)
+
+    def _fire(self):
+
+        now = time.monotonic()
+        while self._timers and self._timers[0][0] <= now:
+            _, _, timer = heapq.heappop(self._timers)
+            if not timer.cancelled:
+                timer.fire()
+
+
+class _Watch(Base):
+    """
+    A process registered with the `Reactor`.
+    """
+
+    def __init__(self, process, pipes, on_line, on_exit, encoding=None, binary=False):
+
+        self.process = process
+        self.pipes = dict(pipes)
+        self.buffers = dict((name, LineBuffer(encoding, binary)) for name in pipes)
+        self.on_line = on_line
+        self.on_exit = on_exit
+        self.pidfd = None
+
+    def call(self, callback, *args):
+
+        # an error in one callback must not stop the reactor for everyone
+        try:
+            callback(*args)
+        except Exception:
+            pass
+
+
+class _Timer(Base):
+    """
+    A callback scheduled with `Reactor.call_later`.
+    """
+
+    def __init__(self, deadline, callback):
+
+        self.deadline = deadline
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+
+        self.cancelled = True
+
+    def fire(self):
+
+        # like the callbacks of a `_Watch`, errors must not stop the reactor
+        try:
+            self.callback()
+        except Exception:
+            pass
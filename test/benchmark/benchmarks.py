@@ -0,0 +1,237 @@
+"""
+The benchmarks, run by `run.py`.
+
+Each benchmark is a function that does its setup, and returns the callable to
+time. Benchmarks registered with `samples=True` measure themselves instead,
+and return a list of samples, in seconds.
+"""
+
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from sultan.api import SSHConfig, Sultan
+from sultan.echo import Echo, handler
+
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(function=None, samples=False):
+
+    def register(function):
+        function.samples = samples
+        BENCHMARKS[function.__name__] = function
+        return function
+
+    return register(function) if function else register
+
+
+@contextmanager
+def quiet_handler():
+    """
+    Sends the log records to /dev/null, so that logging is measured without
+    the terminal.
+    """
+    with open(os.devnull, 'w') as devnull:
+        stream = handler.setStream(devnull)
+        try:
+            yield
+        finally:
+            handler.setStream(stream)
+
+
+# -- importing
+
+
+IMPORT = """
+import time
+start = time.perf_counter()
+from sultan.api import Sultan
+print(time.perf_counter() - start)
+"""
+
+
+@benchmark(samples=True)
+def import_sultan():
+    """
+    How long `from sultan.api import Sultan` takes, in a new interpreter.
+    """
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(sys.modules['sultan'].__file__)))
+    return [float(subprocess.check_output([sys.executable, '-c', IMPORT], env=env)) for _ in range(10)]
+
+
+# -- building commands
+
+
+@benchmark
+def construct():
+
+    return lambda: Sultan.load(cwd='/tmp', logging=False)
+
+
+@benchmark
+def build_long_chain():
+
+    def build():
+        s = Sultan()
+        for i in range(100):
+            s.echo('hodor', i).and_()
+        s.true()
+        return str(s)
+
+    return build
+
+
+@benchmark
+def build_with_context():
+
+    s = Sultan.load(cwd='/tmp', src='/etc/profile', hostname='myserver.com', user='hodor',
+                    ssh_config=SSHConfig(port=2222), logging=False)
+
+    def build():
+        s.ls('-lah').pipe().grep('hodor').redirect('/tmp/hodor.txt', stdout=True)
+        command = str(s)
+        s.clear()
+        return command
+
+    return build
+
+
+# -- running commands
+
+
+@benchmark
+def run_trivial():
+
+    s = Sultan.load(logging=False)
+    return lambda: s.true().run()
+
+
+@benchmark
+def run_trivial_shell():
+
+    s = Sultan.load(logging=False)
+    return lambda: s.true().and_().true().run()
+
+
+@benchmark
+def run_pipeline():
+
+    s = Sultan.load(logging=False)
+    return lambda: s.echo('hodor').pipe().cat().run()
+
+
+# -- capturing output
+
+
+@benchmark
+def capture_large_stdout():
+
+    s = Sultan.load(logging=False)
+    return lambda: len(s.seq(1, 500000).run().stdout)
+
+
+@benchmark
+def capture_large_binary():
+
+    s = Sultan.load(logging=False)
+    return lambda: len(s.head('-c', 32 * 1024 * 1024, '/dev/zero').run(binary=True).stdout)
+
+
+# -- streaming
+
+
+PRODUCER = """
+import sys, time
+for _ in range(200):
+    sys.stdout.write('%r\\n' % time.monotonic())
+    sys.stdout.flush()
+    time.sleep(0.002)
+"""
+
+
+@benchmark(samples=True)
+def streaming_line_latency():
+    """
+    How long it takes for a line written by a command to be read from a
+    streaming `Result`. The command writes the (system-wide) monotonic clock.
+    """
+    fd, path = tempfile.mkstemp(suffix='.py')
+    with os.fdopen(fd, 'w') as f:
+        f.write(PRODUCER)
+
+    latencies = []
+    try:
+        s = Sultan.load(logging=False)
+        result = getattr(s, sys.executable)(path).run(streaming=True)
+        while True:
+            complete = result.is_complete
+            for line in result.iter_stdout():
+                latencies.append(time.monotonic() - float(line))
+            if complete:
+                break
+            time.sleep(0.0001)
+    finally:
+        os.unlink(path)
+
+    return latencies
+
+
+# -- logging
+
+
+@benchmark
+def run_logging_off():
+
+    s = Sultan.load(logging=False)
+    return lambda: s.true().run()
+
+
+@benchmark
+def run_logging_on():
+
+    s = Sultan.load(logging=True)
+
+    def run():
+        with quiet_handler():
+            return s.true().run()
+
+    return run
+
+
+@benchmark
+def format_record():
+
+    record = logging.makeLogRecord({'name': 'sultan', 'levelname': 'DEBUG', 'levelno': logging.DEBUG,
+                                    'msg': 'ls -lah /tmp | grep hodor;'})
+    return lambda: handler.format(record)
+
+
+@benchmark
+def echo_cmd():
+
+    echo = Echo()
+
+    def log():
+        with quiet_handler():
+            for _ in range(100):
+                echo.cmd('ls -lah /tmp | grep hodor;')
+
+    return log
+
+
+@benchmark
+def print_stdout():
+
+    result = Sultan.load(logging=True).seq(1, 1000).run(quiet=True)
+
+    def log():
+        with quiet_handler():
+            result.print_stdout(always_print=True)
+
+    return log
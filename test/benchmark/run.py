@@ -0,0 +1,133 @@
+"""
+Runs the benchmarks, and compares them with a baseline.
+
+Usage::
+
+    # run the benchmarks
+    python test/benchmark/run.py
+
+    # compare with the stored baseline (exits with 1 on a regression)
+    python test/benchmark/run.py --compare test/benchmark/baseline.json
+
+    # store a new baseline
+    python test/benchmark/run.py --save test/benchmark/baseline.json
+
+The benchmarks run against the code in `src/`. Timings depend on the machine,
+so only compare baselines that were stored on the same machine.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import timeit
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src')
+sys.path.insert(0, os.path.abspath(SRC))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchmarks import BENCHMARKS  # noqa: E402
+
+
+def measure(function, repeat):
+    """
+    Returns the time of one call of what `function` returns, for each of the
+    `repeat` rounds, in seconds.
+    """
+    if function.samples:
+        samples = []
+        for _ in range(repeat):
+            samples.extend(function())
+        return samples
+
+    timer = timeit.Timer(function())
+    number, _ = timer.autorange()
+    return [elapsed / number for elapsed in timer.repeat(repeat, number)]
+
+
+def summarize(samples):
+
+    return {
+        'median': statistics.median(samples),
+        'min': min(samples),
+        'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'rounds': len(samples),
+    }
+
+
+def format_time(seconds):
+
+    for unit, scale in (('s', 1), ('ms', 1e3), ('us', 1e6)):
+        if seconds * scale >= 1:
+            return '%.3f%s' % (seconds * scale, unit)
+    return '%.3fns' % (seconds * 1e9)
+
+
+def report(results, baseline=None, threshold=0.2):
+    """
+    Prints the results (and the change from the baseline), and returns the
+    names of the benchmarks that got slower by more than `threshold`.
+    """
+    regressions = []
+    width = max(len(name) for name in results)
+    for name, stats in results.items():
+        line = '%-*s  %12s  +- %10s' % (width, name, format_time(stats['median']), format_time(stats['stdev']))
+        previous = (baseline or {}).get(name)
+        if previous:
+            change = stats['median'] / previous['median'] - 1
+            line += '  %12s  %+7.1f%%' % (format_time(previous['median']), change * 100)
+            if change > threshold:
+                line += '  SLOWER'
+                regressions.append(name)
+            elif change < -threshold:
+                line += '  faster'
+        print(line)
+    return regressions
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Runs the Sultan benchmarks.')
+    parser.add_argument('names', nargs='*', help='the benchmarks to run (default: all of them)')
+    parser.add_argument('--repeat', type=int, default=5, help='how many rounds to run (default: 5)')
+    parser.add_argument('--save', metavar='PATH', help='store the results as a baseline')
+    parser.add_argument('--compare', metavar='PATH', help='compare the results with a baseline')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='how much slower a benchmark may get, i.e.: 0.2 for 20%% (default: 0.2)')
+    args = parser.parse_args(argv)
+
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error('unknown benchmarks: %s' % ', '.join(sorted(unknown)))
+
+    results = {}
+    for name, function in BENCHMARKS.items():
+        if not args.names or name in args.names:
+            results[name] = summarize(measure(function, args.repeat))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['benchmarks']
+
+    regressions = report(results, baseline, args.threshold)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'benchmarks': results,
+            }, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+    if regressions:
+        print('\n%d benchmark(s) got slower: %s' % (len(regressions), ', '.join(regressions)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
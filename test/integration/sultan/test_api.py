@@ -2,6 +2,7 @@ import os
 import shutil
 import stat
 import tempfile
+import time
 import unittest
 from sultan.api import Sultan
 
@@ -118,3 +119,22 @@ class SultanReturnCode(unittest.TestCase):
         with Sultan.load() as s:
             response = s.exit(22).run(halt_on_nonzero=False)
             self.assertEqual(response.rc, 22)
+
+
+class SultanStreaming(unittest.TestCase):
+    """
+    Checks on streaming the output of a command.
+    """
+
+    def test_streaming(self):
+        with Sultan.load() as s:
+            result = s.echo('first').and_().echo('error', '>&2').and_().head('-n 1').run(streaming=True)
+            result.stdin('second')
+            for _ in range(50):
+                if result.is_complete:
+                    break
+                time.sleep(0.1)
+            self.assertTrue(result.is_complete)
+            self.assertEqual(result.rc, 0)
+            self.assertEqual(result.stdout, ['first', 'second'])
+            self.assertEqual(result.stderr, ['error'])
@@ -0,0 +1,93 @@
+import asyncio
+import subprocess
+import unittest
+
+from sultan.aio import AsyncResult, AsyncSultan
+
+
+class AsyncSultanTestCase(unittest.TestCase):
+
+    def run_async(self, coroutine):
+
+        return asyncio.new_event_loop().run_until_complete(coroutine)
+
+    def test_command_generation(self):
+
+        with AsyncSultan.load(cwd='/tmp') as s:
+            self.assertEqual(str(s.ls('-lah')), 'cd /tmp && ls -lah;')
+
+    def test_run_returns_awaitable(self):
+
+        s = AsyncSultan()
+        result = s.echo('hodor').run()
+        self.assertTrue(isinstance(result, AsyncResult))
+        self.assertFalse(result.is_complete)
+        self.assertEqual(s.commands, [])
+
+    def test_run(self):
+
+        async def main():
+            s = AsyncSultan()
+            return await s.echo('hodor').run()
+
+        result = self.run_async(main())
+        self.assertTrue(result.is_complete)
+        self.assertTrue(result.is_success)
+        self.assertEqual(result.rc, 0)
+        self.assertEqual(result.stdout, ['hodor'])
+        self.assertEqual(result.stderr, [])
+
+    def test_run_concurrently(self):
+
+        async def main():
+            s = AsyncSultan()
+            return await asyncio.gather(*[s.echo(i).run() for i in range(10)])
+
+        results = self.run_async(main())
+        self.assertEqual([r.stdout for r in results], [[str(i)] for i in range(10)])
+
+    def test_await_twice(self):
+
+        async def main():
+            result = AsyncSultan().echo('hodor').run()
+            first = await result
+            second = await result
+            return first, second
+
+        first, second = self.run_async(main())
+        self.assertTrue(first is second)
+
+    def test_run_halt_on_nonzero(self):
+
+        async def main():
+            return await AsyncSultan.load(logging=False).exit(3).run()
+
+        with self.assertRaises(subprocess.CalledProcessError):
+            self.run_async(main())
+
+        async def main():
+            return await AsyncSultan.load(logging=False).exit(3).run(halt_on_nonzero=False)
+
+        result = self.run_async(main())
+        self.assertEqual(result.rc, 3)
+        self.assertTrue(result.is_failure)
+
+    def test_run_many(self):
+
+        async def main():
+            s = AsyncSultan()
+            ordered = await s.run_many(['echo a', s.echo('b').detach(), 'echo c'], max_workers=2)
+            mapped = await s.map('echo {}', ['d', 'e'], ordered=False)
+            return ordered, mapped
+
+        ordered, mapped = self.run_async(main())
+        self.assertEqual([r.stdout for r in ordered], [['a'], ['b'], ['c']])
+        self.assertEqual(sorted(r.stdout for r in mapped), [['d'], ['e']])
+
+        with self.assertRaises(ValueError):
+            self.run_async(AsyncSultan().run_many(['true'], timeout=1))
+
+    def test_streaming_not_supported(self):
+
+        with self.assertRaises(ValueError):
+            AsyncSultan().ls().run(streaming=True)
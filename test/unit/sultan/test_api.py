@@ -1,13 +1,16 @@
 import mock
 import os
 import shutil
+import subprocess
 import tempfile
+import time
 import unittest
 import getpass
 
 from sultan.api import And, Or, Command, Pipe, Redirect, Sultan, SSHConfig
 from sultan.config import Settings
 from sultan.exceptions import InvalidContextError
+from sultan.output import BinaryOutput, TextOutput
 
 
 class SultanTestCase(unittest.TestCase):
@@ -24,14 +27,13 @@ class SultanTestCase(unittest.TestCase):
         self.assertTrue(isinstance(sultan.redirect, Redirect))
         self.assertTrue(isinstance(sultan.foobar, Command))
 
-    @mock.patch("sultan.api.subprocess")
-    def test_run_basic(self, m_subprocess):
-        m_subprocess.Popen = mock.Mock()
-        m_subprocess.Popen().communicate.return_value = ("sample_response", "")
-        m_subprocess.Popen().returncode = 0
+    @mock.patch("sultan.api.Process")
+    def test_run_basic(self, m_process):
+        m_process().communicate.return_value = ("sample_response", "")
+        m_process().returncode = 0
         sultan = Sultan()
         response = sultan.ls("-lah /tmp").run()
-        self.assertTrue(m_subprocess.Popen().communicate.called)
+        self.assertTrue(m_process().communicate.called)
         self.assertEqual(response.stdout, ["sample_response"])
 
     def test_run_advanced(self):
@@ -50,10 +52,10 @@ class SultanTestCase(unittest.TestCase):
             if os.path.exists('/tmp/mytestdir'):
                 shutil.rmtree('/tmp/mytestdir')
 
-    @mock.patch('sultan.api.subprocess')
-    def test_run_halt_on_nonzero(self, m_subprocess):
+    @mock.patch('sultan.api.Process')
+    def test_run_halt_on_nonzero(self, m_process):
 
-        m_subprocess.Popen.side_effect = OSError(1, "foobar")
+        m_process.side_effect = OSError(1, "foobar")
         s = Sultan()
         with self.assertRaises(OSError):
             s.foobar("-qux").run()
@@ -381,6 +383,144 @@ class SultanTestCase(unittest.TestCase):
             if os.path.exists(filepath):
                 os.unlink(filepath)
 
+    def test_run_binary(self):
+
+        sultan = Sultan()
+        response = sultan.printf("'a\\000b\\nc\\377'").run(binary=True)
+        self.assertTrue(isinstance(response.stdout, BinaryOutput))
+        self.assertEqual(response.stdout.data, b'a\x00b\nc\xff')
+        self.assertEqual([bytes(line) for line in response.stdout], [b'a\x00b', b'c\xff'])
+        self.assertEqual(response.stderr.data, b'')
+
+    def test_run_max_memory(self):
+
+        sultan = Sultan()
+        response = sultan.seq('1 1000').run(max_memory=1024)
+        self.assertTrue(isinstance(response.stdout, TextOutput))
+        self.assertEqual(len(response.stdout), 1000)
+        self.assertEqual(response.stdout, [str(i) for i in range(1, 1001)])
+        self.assertEqual(response.stderr, [])
+        self.assertEqual(response.rc, 0)
+
+        response = sultan.seq('1 10').run(max_memory=1024)
+        self.assertEqual(response.stdout, [str(i) for i in range(1, 11)])
+
+        response = sultan.seq('1 1000').run(max_memory=1024, binary=True)
+        self.assertEqual(len(response.stdout), 1000)
+        self.assertEqual(bytes(response.stdout[-1]), b'1000')
+
+    def test_run_timeout(self):
+
+        sultan = Sultan.load(logging=False)
+        chains = [
+            # the background 'sleep' keeps the pipes open, unless it is killed too
+            lambda: sultan.echo('hodor').and_().sh('-c', '"sleep 30 & sleep 30"'),
+            lambda: sultan.sleep(30).pipe().cat(),
+        ]
+        for chain in chains:
+            start = time.time()
+            response = chain().run(timeout=0.5, halt_on_nonzero=False)
+            self.assertLess(time.time() - start, 10)
+            self.assertTrue(response.timed_out)
+            self.assertTrue(response.is_failure)
+            self.assertTrue(isinstance(response._exception, subprocess.TimeoutExpired))
+
+        self.assertEqual(response.pipestatus, [-9, -9])
+        response = sultan.echo('hodor').and_().sleep(30).run(timeout=0.5, halt_on_nonzero=False, max_memory=1024)
+        self.assertTrue(response.timed_out)
+        self.assertEqual(response.stdout, ['hodor'])
+
+        response = sultan.echo('hodor').run(timeout=10)
+        self.assertFalse(response.timed_out)
+        self.assertEqual(response.stdout, ['hodor'])
+
+        with self.assertRaises(subprocess.TimeoutExpired):
+            sultan.sleep(30).run(timeout=0.1)
+
+    def test_run_streaming_timeout(self):
+
+        sultan = Sultan()
+        response = sultan.sleep(30).run(streaming=True, timeout=0.1, halt_on_nonzero=False)
+        for _ in range(100):
+            if response.is_complete:
+                break
+            time.sleep(0.1)
+        self.assertTrue(response.timed_out)
+        self.assertEqual(response.rc, -9)
+
+    def test_cancel(self):
+
+        sultan = Sultan()
+        response = sultan.sleep(30).run(streaming=True, halt_on_nonzero=False)
+        response.cancel()
+        for _ in range(100):
+            if response.is_complete:
+                break
+            time.sleep(0.1)
+        self.assertFalse(response.timed_out)
+        self.assertEqual(response.rc, -9)
+
+        # chains run by the shell are killed along with the commands they started
+        response = sultan.sleep(30).and_().true().run(streaming=True, halt_on_nonzero=False)
+        pid = response._process.pid
+        self.assertEqual(os.getpgid(pid), pid)
+        time.sleep(0.2)
+        response.cancel()
+        for _ in range(100):
+            if response.is_complete:
+                break
+            time.sleep(0.1)
+        self.assertTrue(response.is_complete)
+        self.assertEqual(response.rc, -9)
+        if os.path.isdir('/proc'):
+            # the processes of the group are gone, or zombies waiting for init
+            states = []
+            for name in os.listdir('/proc'):
+                try:
+                    with open('/proc/%s/stat' % name) as f:
+                        fields = f.read().rsplit(')', 1)[1].split()
+                except (IOError, OSError, IndexError):
+                    continue
+                if int(fields[2]) == pid:
+                    states.append(fields[0])
+            self.assertEqual([state for state in states if state != 'Z'], [])
+
+    def test_detach(self):
+
+        with Sultan.load(cwd='/tmp') as s:
+            chain = s.ls('-lah').detach()
+            self.assertEqual(s.commands, [])
+            self.assertEqual(str(chain), 'cd /tmp && ls -lah;')
+            self.assertEqual(chain.current_context, s.current_context)
+
+    def test_run_many(self):
+
+        s = Sultan()
+        chains = [s.echo(i).detach() for i in range(5)] + ['echo 5']
+        results = s.run_many(chains, max_workers=2)
+        self.assertEqual([r.stdout for r in results], [[str(i)] for i in range(6)])
+
+    def test_run_many_completion_order(self):
+
+        s = Sultan()
+        results = s.run_many(['sleep 0.5; echo slow', 'echo fast'], ordered=False)
+        self.assertEqual([r.stdout for r in results], [['fast'], ['slow']])
+
+    def test_run_many_halt_on_nonzero(self):
+
+        s = Sultan.load(logging=False)
+        results = s.run_many(['exit 1', 'echo ok'], halt_on_nonzero=False)
+        self.assertEqual([r.rc for r in results], [1, 0])
+
+    def test_map(self):
+
+        with Sultan.load(cwd='/tmp') as s:
+            results = s.map('echo {} $(pwd)', ['a', 'b'])
+            self.assertEqual([r.stdout for r in results], [['a /tmp'], ['b /tmp']])
+
+            results = s.map('echo {}-{}', [(1, 2), (3, 4)])
+            self.assertEqual([r.stdout for r in results], [['1-2'], ['3-4']])
+
 
 class SultanCommandTestCase(unittest.TestCase):
 
@@ -0,0 +1,88 @@
+import subprocess
+import unittest
+
+from sultan.api import Sultan
+from sultan.batch import Batch
+
+
+class BatchTestCase(unittest.TestCase):
+
+    def test_batch(self):
+
+        s = Sultan()
+        batch = s.batch()
+        self.assertTrue(isinstance(batch, Batch))
+        self.assertEqual(str(batch.ls('-lah')), 'ls -lah;')
+
+    def test_run(self):
+
+        with Sultan().batch() as batch:
+            first = batch.echo('hodor').and_().echo('error', '>&2').run()
+            second = batch.sh('-c', '"exit 3"').run(halt_on_nonzero=False)
+            third = batch.printf('hodor').run()
+            self.assertFalse(first.is_complete)
+
+        self.assertEqual(batch.results, [first, second, third])
+        self.assertTrue(first.is_complete)
+        self.assertEqual(first.stdout, ['hodor'])
+        self.assertEqual(first.stderr, ['error'])
+        self.assertEqual(first.rc, 0)
+        self.assertEqual(second.rc, 3)
+        self.assertEqual(second.stdout, [])
+        self.assertEqual(third.stdout, ['hodor'])
+
+    def test_run_many(self):
+
+        with Sultan().batch() as batch:
+            batch.echo('later')
+            results = batch.map('echo {}', ['a', 'b'])
+            self.assertEqual(str(batch), 'echo later;')
+            batch.clear()
+
+        self.assertEqual([r.stdout for r in results], [['a'], ['b']])
+        self.assertEqual(batch.results, results)
+
+        with self.assertRaises(ValueError):
+            Sultan().batch().run_many(['true'], timeout=1)
+
+    def test_context(self):
+
+        with Sultan.load(cwd='/tmp') as s:
+            with s.batch() as batch:
+                first = batch.pwd().run()
+                batch.cd('/').run()
+                second = batch.pwd().run()
+
+        self.assertEqual(first.stdout, ['/tmp'])
+        self.assertEqual(second.stdout, ['/'])
+
+    def test_exit(self):
+
+        batch = Sultan().batch()
+        first = batch.echo('hodor').run()
+        second = batch.exit(4).run(halt_on_nonzero=False)
+        third = batch.echo('never').run(halt_on_nonzero=False)
+        self.assertEqual(batch.execute(), [first, second, third])
+
+        self.assertEqual(first.rc, 0)
+        self.assertEqual(second.rc, 4)
+        self.assertEqual(third.rc, None)
+        self.assertEqual(third.stdout, [])
+
+    def test_halt_on_nonzero(self):
+
+        with Sultan.load(logging=False) as s:
+            batch = s.batch()
+            batch.ls('/no/such/directory').run()
+            last = batch.echo('ok').run()
+            with self.assertRaises(subprocess.CalledProcessError):
+                batch.execute()
+
+        self.assertEqual(last.stdout, ['ok'])
+
+    def test_binary(self):
+
+        with Sultan().batch() as batch:
+            result = batch.printf('hodor').run(binary=True)
+
+        self.assertEqual(bytes(result.stdout), b'hodor')
@@ -1,5 +1,13 @@
+import os
+import shutil
+import sys
+import tempfile
 import unittest
+
+from sultan import config
+from sultan.api import Sultan
 from sultan.config import Settings
+from sultan.echo import handler
 
 
 class TestSettings(unittest.TestCase):
@@ -24,4 +32,53 @@ class TestSettings(unittest.TestCase):
             'WARNING': 'yellow',
             'ERROR': 'red',
             'CRITICAL': 'bold_red',
-        })
\ No newline at end of file
+        })
+
+class TestReload(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp()
+        with open(os.path.join(self.directory, 'hodor_settings.py'), 'w') as f:
+            f.write("LOG_FORMAT = '%(message)s'\nlowercase = 'ignored'\n")
+        sys.path.insert(0, self.directory)
+        self.changes = []
+        config.on_change(self.on_change)
+
+    def tearDown(self):
+
+        config.remove_on_change(self.on_change)
+        os.environ.pop(config.SULTAN_SETTINGS_MODULE_ENV, None)
+        config.reload()
+        sys.path.remove(self.directory)
+        sys.modules.pop('hodor_settings', None)
+        shutil.rmtree(self.directory)
+
+    def on_change(self, settings, changed):
+
+        self.changes.append((settings, changed))
+
+    def test_shared(self):
+
+        self.assertTrue(config.get_settings() is config.get_settings())
+        self.assertTrue(Sultan().settings is Sultan().settings)
+        with self.assertRaises(AttributeError):
+            config.get_settings().HALT_ON_ERROR = False
+        with self.assertRaises(TypeError):
+            config.get_settings().LOG_COLORS['DEBUG'] = 'red'
+
+    def test_reload(self):
+
+        settings = config.get_settings()
+        self.assertTrue(config.reload() is not settings)
+        self.assertEqual(self.changes, [])
+
+        os.environ[config.SULTAN_SETTINGS_MODULE_ENV] = 'hodor_settings'
+        settings = config.reload()
+        self.assertEqual(settings.LOG_FORMAT, '%(message)s')
+        self.assertEqual(config.settings.LOG_FORMAT, '%(message)s')
+        self.assertEqual(Sultan().settings.LOG_FORMAT, '%(message)s')
+        with self.assertRaises(ValueError):
+            settings.lowercase
+        self.assertEqual(self.changes, [(settings, set(['LOG_FORMAT']))])
+        self.assertEqual(handler.formatter._fmt, '%(message)s')
@@ -0,0 +1,190 @@
+import io
+import logging
+import time
+import unittest
+
+from sultan.api import Sultan
+from sultan.echo import Echo, LogSampler, disable_queue, enable_queue, handler
+from sultan.echo.colorlog import ColoredFormatter, LevelFormatter
+from sultan.echo.queued import QueuedHandler
+from sultan.echo.colorlog.escape_codes import escape_codes
+
+
+class TTY(io.StringIO):
+
+    def isatty(self):
+
+        return True
+
+
+class ColoredFormatterTestCase(unittest.TestCase):
+
+    def record(self, levelname='INFO', msg='hodor %s', args=('hodor',)):
+
+        return logging.makeLogRecord({'name': 'sultan', 'levelname': levelname, 'levelno': 20,
+                                      'msg': msg, 'args': args})
+
+    def test_format(self):
+
+        formatter = ColoredFormatter('%(log_color)s[%(name)s]: %(bold)s%(message)s', stream=TTY())
+        self.assertEqual(formatter.format(self.record()),
+                         '%s[sultan]: %shodor hodor%s' % (escape_codes['green'], escape_codes['bold'],
+                                                          escape_codes['reset']))
+        self.assertEqual(formatter.format(self.record('CRITICAL')),
+                         '%s[sultan]: %shodor hodor%s' % (escape_codes['bold_red'], escape_codes['bold'],
+                                                          escape_codes['reset']))
+
+    def test_styles(self):
+
+        expected = '%sINFO:%shodor hodor %%s%s' % (escape_codes['green'], escape_codes['red'], escape_codes['reset'])
+        formatter = ColoredFormatter('{log_color}{levelname}:{red}{message} {{red}}', style='{')
+        self.assertEqual(formatter.format(self.record()), expected % '{red}')
+        formatter = ColoredFormatter('${log_color}$levelname:${red}$message $$red', style='$')
+        self.assertEqual(formatter.format(self.record()), expected % '$red')
+
+    def test_secondary_log_colors(self):
+
+        formatter = ColoredFormatter('%(log_color)s%(levelname)s%(reset)s %(message_log_color)s%(message)s',
+                                     secondary_log_colors={'message': {'INFO': 'blue'}})
+        self.assertEqual(formatter.format(self.record()),
+                         '%sINFO%s %shodor hodor%s' % (escape_codes['green'], escape_codes['reset'],
+                                                       escape_codes['blue'], escape_codes['reset']))
+
+    def test_plain(self):
+
+        formatter = ColoredFormatter('%(log_color)s[%(name)s]: %(bold)s%(message)s%(reset)s',
+                                     secondary_log_colors={'message': {'INFO': 'blue'}}, stream=io.StringIO())
+        self.assertEqual(formatter.format(self.record()), '[sultan]: hodor hodor')
+
+    def test_extra(self):
+
+        formatter = ColoredFormatter('%(log_color)s%(host)s: %(message)s')
+        record = self.record()
+        record.host = 'myserver.com'
+        self.assertEqual(formatter.format(record),
+                         '%smyserver.com: hodor hodor%s' % (escape_codes['green'], escape_codes['reset']))
+
+    def test_record_unchanged(self):
+
+        formatter = ColoredFormatter('%(log_color)s%(message)s', secondary_log_colors={'message': {'INFO': 'blue'}})
+        record = self.record()
+        formatter.format(record)
+        self.assertFalse(hasattr(record, 'log_color'))
+        self.assertFalse(hasattr(record, 'message_log_color'))
+
+    def test_level_formatter(self):
+
+        formatter = LevelFormatter('%(log_color)s%(message)s', stream=io.StringIO())
+        self.assertEqual(formatter.format(self.record()), 'hodor hodor')
+
+
+class SlowStream(io.StringIO):
+
+    def write(self, data):
+
+        time.sleep(0.05)
+        return super(SlowStream, self).write(data)
+
+
+class QueuedHandlerTestCase(unittest.TestCase):
+
+    def setUp(self):
+
+        self.stream = SlowStream()
+        self.target = logging.StreamHandler(self.stream)
+        self.target.setFormatter(logging.Formatter('%(levelname)s:%(message)s'))
+
+    def record(self, msg, *args):
+
+        return logging.makeLogRecord({'name': 'sultan', 'levelname': 'INFO', 'levelno': logging.INFO,
+                                      'msg': msg, 'args': args})
+
+    def test_emit(self):
+
+        queued = QueuedHandler(self.target)
+        try:
+            start = time.time()
+            for i in range(100):
+                queued.handle(self.record('hodor %s', i))
+            self.assertLess(time.time() - start, 0.05)
+
+            queued.flush()
+            self.assertEqual(self.stream.getvalue().splitlines(), ['INFO:hodor %s' % i for i in range(100)])
+        finally:
+            queued.close()
+
+    def test_writer(self):
+
+        queued = QueuedHandler(self.target, flush_interval=0.01)
+        try:
+            queued.handle(self.record('hodor'))
+            deadline = time.time() + 5
+            while not self.stream.getvalue() and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(self.stream.getvalue(), 'INFO:hodor\n')
+        finally:
+            queued.close()
+
+    def test_drop(self):
+
+        queued = QueuedHandler(self.target, capacity=10, flush_interval=60)
+        try:
+            for i in range(15):
+                queued.handle(self.record('hodor %s', i))
+            self.assertEqual(queued.dropped, 5)
+
+            queued.flush()
+            lines = self.stream.getvalue().splitlines()
+            self.assertEqual(lines[:-1], ['INFO:hodor %s' % i for i in range(10)])
+            self.assertEqual(lines[-1], 'WARNING:Dropped 5 log records, the log stream is too slow.')
+        finally:
+            queued.close()
+
+    def test_echo(self):
+
+        queued = enable_queue()
+        try:
+            self.assertTrue(queued in logging.getLogger('sultan').handlers)
+            self.assertFalse(handler in Echo().logger.handlers)
+        finally:
+            disable_queue()
+        self.assertEqual(logging.getLogger('sultan').handlers, [handler])
+
+
+class LogSamplerTestCase(unittest.TestCase):
+
+    def test_allow(self):
+
+        sampler = LogSampler(first=3, every=4)
+        allowed = [i for i in range(1, 16) if sampler.allow()]
+        self.assertEqual(allowed, [1, 2, 3, 7, 11, 15])
+        self.assertEqual(sampler.suppressed, 9)
+        self.assertEqual(sampler.take_summary(), 0)
+        self.assertEqual(sampler.take_summary(force=True), 9)
+        self.assertEqual(sampler.take_summary(force=True), 0)
+
+    def test_rate(self):
+
+        sampler = LogSampler(first=None, rate=10)
+        self.assertEqual(sum(sampler.allow() for _ in range(100)), 10)
+
+    def test_print_stdout(self):
+
+        stream = io.StringIO()
+        target = logging.StreamHandler(stream)
+        logger = logging.getLogger('sultan')
+        logger.addHandler(target)
+        logger.removeHandler(handler)
+        try:
+            with Sultan.load(log_sampler=LogSampler(first=5, every=100)) as s:
+                s.seq(1, 1000).run().print_stdout()
+        finally:
+            logger.removeHandler(target)
+            logger.addHandler(handler)
+
+        # the command and its output share the sampler of the context
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(lines[0], 'seq 1 1000;')
+        self.assertEqual([line for line in lines if line.startswith('| ')],
+                         ['| %s' % i for i in (1, 2, 3, 4, 104, 204, 304, 404, 504, 604, 704, 804, 904)])
+        self.assertEqual(lines[-2], "Suppressed 987 log lines (see 'log_sampler').")
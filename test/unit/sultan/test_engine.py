@@ -0,0 +1,249 @@
+import errno
+import mock
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import unittest
+
+from sultan.api import Command, Sultan
+from sultan.engine import Pipeline, compile_argv, compile_pipeline
+from sultan.process import Process
+
+
+class CompileArgvTestCase(unittest.TestCase):
+
+    def compile(self, sultan):
+
+        return compile_argv(sultan.commands, sultan.current_context)
+
+    def test_simple_command(self):
+
+        s = Sultan()
+        self.assertEqual(self.compile(s.ls('-lah', '/tmp')), ['ls', '-lah', '/tmp'])
+
+        s = Sultan()
+        self.assertEqual(self.compile(s.grep('"two words"', 'file.txt')),
+                         ['grep', 'two words', 'file.txt'])
+
+        s = Sultan()
+        self.assertEqual(self.compile(s.curl('http://example.com', silent=True, o='/tmp/page')),
+                         ['curl', '--silent=True', '-o=/tmp/page', 'http://example.com'])
+
+    def test_cwd(self):
+
+        with Sultan.load(cwd='/tmp') as s:
+            self.assertEqual(self.compile(s.ls('-lah')), ['ls', '-lah'])
+
+    def test_chains(self):
+
+        for build in (lambda s: s.ls().pipe().wc('-l'),
+                      lambda s: s.touch('/tmp/foo').and_().ls(),
+                      lambda s: s.touch('/tmp/foo').or_().ls(),
+                      lambda s: s.touch('/tmp/foo').ls(),
+                      lambda s: s.ls().redirect('/tmp/foo', stdout=True)):
+            self.assertEqual(self.compile(build(Sultan())), None)
+
+    def test_shell_syntax(self):
+
+        for args in ('$HOME', '*.txt', '`whoami`', 'a > b', '~/foo', 'a; b', '"unbalanced'):
+            self.assertEqual(self.compile(Sultan().ls(args)), None)
+
+    def test_builtins(self):
+
+        self.assertEqual(self.compile(Sultan().cd('/tmp')), None)
+        self.assertEqual(self.compile(Sultan().exit(1)), None)
+        self.assertEqual(self.compile(Sultan().echo('hodor')), None)
+
+        s = Sultan()
+        self.assertEqual(self.compile(Command(s, 'FOO=bar')('env')), None)
+
+    def test_context(self):
+
+        for context in ({'sudo': True}, {'hostname': 'google.com'},
+                        {'src': '/tmp/env'}, {'executable': '/bin/bash'}):
+            s = Sultan(context=context)
+            self.assertEqual(self.compile(s.ls('-lah')), None)
+
+
+class ExecEngineTestCase(unittest.TestCase):
+
+    @mock.patch('sultan.api.Process')
+    def test_run_without_shell(self, m_process):
+
+        m_process().communicate.return_value = ("", "")
+        m_process().returncode = 0
+        with Sultan.load(cwd='/tmp') as s:
+            s.ls('-lah').run()
+        args, kwargs = m_process.call_args
+        self.assertEqual(args[0], ['ls', '-lah'])
+        self.assertEqual(kwargs['cwd'], '/tmp')
+        self.assertFalse(kwargs.get('shell'))
+
+    def test_run(self):
+
+        with Sultan.load(cwd='/tmp') as s:
+            self.assertEqual(s.ls('-d', '.').run().stdout, ['.'])
+
+    def test_missing_command(self):
+
+        with Sultan.load(logging=False) as s:
+            result = s.no_such_command_for_sultan().run(halt_on_nonzero=False)
+            self.assertEqual(result.rc, 127)
+
+
+class CompilePipelineTestCase(unittest.TestCase):
+
+    def compile(self, sultan):
+
+        stages = compile_pipeline(sultan.commands, sultan.current_context)
+        if stages is None:
+            return None
+        return [(stage.argv, stage.stdout, stage.stderr, stage.append) for stage in stages]
+
+    def test_pipes(self):
+
+        s = Sultan()
+        self.assertEqual(self.compile(s.cat('/etc/hosts').pipe().grep('"local host"').pipe().wc('-l')), [
+            (['cat', '/etc/hosts'], None, None, False),
+            (['grep', 'local host'], None, None, False),
+            (['wc', '-l'], None, None, False),
+        ])
+
+    def test_redirects(self):
+
+        s = Sultan()
+        self.assertEqual(self.compile(s.ls('/tmp').redirect('/tmp/out', stdout=True)), [
+            (['ls', '/tmp'], '/tmp/out', None, False),
+        ])
+
+        s = Sultan()
+        self.assertEqual(self.compile(
+            s.ls('/tmp').redirect('/tmp/out', stdout=True, stderr=True, append=True).pipe().wc()), [
+            (['ls', '/tmp'], '/tmp/out', '/tmp/out', True),
+            (['wc'], None, None, False),
+        ])
+
+    def test_shell_needed(self):
+
+        for build in (lambda s: s.ls().and_().wc('-l'),
+                      lambda s: s.ls().or_().wc('-l'),
+                      lambda s: s.ls().wc('-l'),
+                      lambda s: s.ls().pipe(),
+                      lambda s: s.pipe().ls(),
+                      lambda s: s.ls('$HOME').pipe().wc('-l'),
+                      lambda s: s.ls().pipe().wc('-l').redirect('$HOME/out', stdout=True)):
+            self.assertEqual(self.compile(build(Sultan())), None)
+
+        with Sultan.load(sudo=True) as s:
+            self.assertEqual(self.compile(s.ls().pipe().wc('-l')), None)
+
+
+class PipelineTestCase(unittest.TestCase):
+
+    def setUp(self):
+
+        self.path = tempfile.mkdtemp()
+        self.input = os.path.join(self.path, 'input')
+        with open(self.input, 'w') as f:
+            f.write('b\na\nb\n')
+
+    def tearDown(self):
+
+        shutil.rmtree(self.path)
+
+    def test_run(self):
+
+        s = Sultan()
+        result = s.cat(self.input).pipe().sort().pipe().uniq('-c').run()
+        self.assertTrue(isinstance(result._process, Pipeline))
+        self.assertEqual([line.split() for line in result.stdout], [['1', 'a'], ['2', 'b']])
+        self.assertEqual(result.pipestatus, [0, 0, 0])
+
+    def test_pipestatus(self):
+
+        s = Sultan.load(logging=False)
+        result = s.ls('/no/such/directory').pipe().cat().run(halt_on_nonzero=False)
+        self.assertEqual(result.rc, 0)
+        self.assertEqual(result.pipestatus[1], 0)
+        self.assertNotEqual(result.pipestatus[0], 0)
+        self.assertTrue(result.stderr)
+
+        result = s.printf('hodor').pipe().grep('nope').run(halt_on_nonzero=False)
+        self.assertEqual(result.rc, 1)
+        self.assertEqual(result.pipestatus, [0, 1])
+
+    def test_redirect(self):
+
+        with Sultan.load(cwd=self.path) as s:
+            result = s.printf('hodor').redirect('out', stdout=True).run()
+            self.assertTrue(isinstance(result._process, Pipeline))
+            self.assertEqual(result.stdout, [])
+            s.printf('hodor').redirect('out', stdout=True, append=True).run()
+            s.ls('/no/such/directory').redirect('err', stderr=True).run(halt_on_nonzero=False)
+
+        with open(os.path.join(self.path, 'out')) as f:
+            self.assertEqual(f.read(), 'hodorhodor')
+        with open(os.path.join(self.path, 'err')) as f:
+            self.assertTrue(f.read())
+
+    def test_missing_command(self):
+
+        s = Sultan.load(logging=False)
+        result = s.cat('/etc/hosts').pipe().no_such_command_for_sultan().run(halt_on_nonzero=False)
+        self.assertFalse(isinstance(result._process, Pipeline))
+        self.assertEqual(result.rc, 127)
+
+        # the stages before the missing command only run once, in the shell
+        out, script = os.path.join(self.path, 'out'), os.path.join(self.path, 'script')
+        with open(script, 'w') as f:
+            f.write('#!/bin/sh\necho ran >> %s\n' % out)
+        os.chmod(script, 0o755)
+        getattr(s, script)().pipe().no_such_command_for_sultan().run(halt_on_nonzero=False)
+        with open(out) as f:
+            self.assertEqual(f.readlines(), ['ran\n'])
+
+    def test_exec_error(self):
+
+        s = Sultan.load(logging=False)
+        out, script = os.path.join(self.path, 'out'), os.path.join(self.path, 'script')
+        with open(script, 'w') as f:
+            f.write('#!/bin/sh\necho ran >> %s\n' % out)
+        os.chmod(script, 0o755)
+
+        # a file without a '#!' line runs in the shell, and the stages before it only once
+        last = os.path.join(self.path, 'last')
+        with open(last, 'w') as f:
+            f.write('cat > /dev/null\necho last\n')
+        os.chmod(last, 0o755)
+        result = getattr(getattr(s, script)().pipe(), last)().run()
+        self.assertFalse(isinstance(result._process, Pipeline))
+        self.assertEqual(result.stdout, ['last'])
+        with open(out) as f:
+            self.assertEqual(f.readlines(), ['ran\n'])
+
+        # a stage that fails to start after the ones before it ran fails the run
+        def start(argv, **kwargs):
+            if argv != [script]:
+                raise OSError(errno.EACCES, os.strerror(errno.EACCES), argv[0])
+            process = Process(argv, **kwargs)
+            process.wait()
+            return process
+
+        with mock.patch('sultan.engine.Process', side_effect=start):
+            result = getattr(s, script)().pipe().cat().run(halt_on_nonzero=False)
+        self.assertTrue(isinstance(result._exception, subprocess.SubprocessError))
+        with open(out) as f:
+            self.assertEqual(f.readlines(), ['ran\n', 'ran\n'])
+
+    def test_streaming(self):
+
+        s = Sultan()
+        result = s.cat(self.input).pipe().sort('-ru').run(streaming=True)
+        for _ in range(50):
+            if result.is_complete:
+                break
+            time.sleep(0.1)
+        self.assertEqual(result.stdout, ['b', 'a'])
+        self.assertEqual(result.pipestatus, [0, 0])
@@ -0,0 +1,195 @@
+import asyncio
+import mock
+import unittest
+
+from sultan.aio import AsyncSultan
+from sultan.api import Sultan
+from sultan.hooks import EVENTS, Hooks, Tracer, group, hooks
+
+
+class HooksTestCase(unittest.TestCase):
+
+    def setUp(self):
+
+        self.events = []
+        for event in EVENTS:
+            hooks.register(event, self.events.append)
+
+    def tearDown(self):
+
+        for event in EVENTS:
+            hooks.unregister(event, self.events.append)
+
+    def test_register(self):
+
+        with self.assertRaises(ValueError):
+            hooks.register('on_nothing', self.events.append)
+
+    def test_run(self):
+
+        result = Sultan().echo('hodor').run()
+        self.assertEqual([event.name for event in self.events],
+                         ['on_build', 'on_spawn', 'on_first_output', 'on_exit'])
+        self.assertEqual(len(set(event.run_id for event in self.events)), 1)
+        self.assertEqual(self.events[0].commands, 'echo hodor;')
+        self.assertEqual(self.events[0].command, 'echo')
+        self.assertEqual(self.events[1].pid, result._process.pid)
+        self.assertTrue(self.events[-1].result is result)
+        self.assertIsNotNone(self.events[-1].result.timing.duration)
+        self.assertEqual(self.events[-1].group, None)
+
+    def test_output_in_hooks(self):
+
+        output = {}
+
+        def on_exit(event):
+            output[event.name] = (event.result.stdout, event.result.stderr)
+
+        hooks.register('on_exit', on_exit)
+        hooks.register('on_error', on_exit)
+        try:
+            with Sultan.load(logging=False) as s:
+                s.echo('hodor').run()
+                self.assertEqual(output, {'on_exit': (['hodor'], [])})
+                with self.assertRaises(Exception):
+                    s.ls('/no/such/directory').run()
+                self.assertTrue(output['on_error'][1])
+        finally:
+            hooks.unregister('on_exit', on_exit)
+            hooks.unregister('on_error', on_exit)
+
+    def test_run_streaming(self):
+
+        result = Sultan().echo('hodor').run(streaming=True)
+        while not result.is_complete:
+            pass
+        self.assertEqual([event.name for event in self.events],
+                         ['on_build', 'on_spawn', 'on_first_output', 'on_exit'])
+
+    def test_error(self):
+
+        with Sultan.load(logging=False) as s:
+            s.false().run(halt_on_nonzero=False)
+            self.assertEqual([event.name for event in self.events],
+                             ['on_build', 'on_spawn', 'on_exit', 'on_error'])
+
+            del self.events[:]
+            with mock.patch('sultan.api.Process', side_effect=OSError(1, 'hodor')):
+                s.echo('hodor').run(halt_on_nonzero=False)
+            self.assertEqual([event.name for event in self.events], ['on_build', 'on_error'])
+            self.assertTrue(isinstance(self.events[-1].exception, OSError))
+
+    def test_session(self):
+
+        with Sultan.load(logging=False).session() as session:
+            session.echo('hodor').run()
+            session.false().run(halt_on_nonzero=False)
+        self.assertEqual([event.name for event in self.events],
+                         ['on_build', 'on_spawn', 'on_exit', 'on_build', 'on_spawn', 'on_exit', 'on_error'])
+        self.assertEqual(self.events[0].command, 'echo')
+        self.assertEqual(self.events[2].result.stdout, ['hodor'])
+
+    def test_async(self):
+
+        result = AsyncSultan.load(logging=False).echo('hodor').run()
+        self.assertEqual(self.events, [])
+        asyncio.new_event_loop().run_until_complete(result)
+        self.assertEqual([event.name for event in self.events], ['on_build', 'on_spawn', 'on_exit'])
+        self.assertEqual(self.events[0].command, 'echo')
+        self.assertTrue(self.events[-1].result is result)
+
+    def test_batch(self):
+
+        with Sultan.load(logging=False).batch() as batch:
+            batch.echo('hodor').run()
+            batch.false().run(halt_on_nonzero=False)
+        self.assertEqual([event.name for event in self.events if event.run_id],
+                         ['on_build', 'on_build', 'on_spawn', 'on_spawn', 'on_exit', 'on_exit', 'on_error'])
+
+        del self.events[:]
+        batch = Sultan.load(logging=False).batch()
+        batch.echo('hodor').run()
+        with mock.patch('subprocess.Popen', side_effect=OSError(1, 'hodor')):
+            self.assertRaises(OSError, batch.execute)
+        self.assertEqual([event.name for event in self.events if event.run_id], ['on_build', 'on_error'])
+
+    def test_context_hooks(self):
+
+        events = []
+        context_hooks = Hooks()
+        context_hooks.register('on_exit', events.append)
+        with Sultan.load(hooks=context_hooks) as s:
+            s.echo('hodor').run()
+        Sultan().echo('hodor').run()
+        self.assertEqual(len(events), 1)
+
+    def test_broken_hook(self):
+
+        def broken(event):
+            raise ValueError('hodor')
+
+        hooks.register('on_exit', broken)
+        try:
+            self.assertEqual(Sultan.load(logging=False).echo('hodor').run().stdout, ['hodor'])
+        finally:
+            hooks.unregister('on_exit', broken)
+
+    def test_group(self):
+
+        with group('deploy', release=1) as deploy:
+            Sultan().run_many(['echo a', 'echo b'])
+
+        names = [event.name for event in self.events]
+        self.assertEqual(names[:2], ['on_group_start', 'on_group_start'])
+        self.assertEqual(names[-2:], ['on_group_end', 'on_group_end'])
+        self.assertEqual(self.events[0].group, deploy)
+        self.assertEqual(deploy.attributes, {'release': 1})
+
+        run_many = self.events[1].group
+        self.assertEqual(run_many.name, 'run_many')
+        self.assertEqual(run_many.parent, deploy)
+        for event in self.events[2:-2]:
+            self.assertEqual(event.group, run_many)
+
+
+class TracerTestCase(unittest.TestCase):
+
+    def setUp(self):
+
+        self.spans = []
+        self.tracer = Tracer(export=self.spans.append).install()
+
+    def tearDown(self):
+
+        self.tracer.uninstall()
+
+    def test_spans(self):
+
+        Sultan().run_many(['echo a', 'false'], halt_on_nonzero=False, quiet=True)
+
+        spans = dict((span.attributes.get('command', span.name), span) for span in self.spans)
+        self.assertEqual(len(spans), 3)
+        run_many, echo, false = spans['run_many'], spans['echo a;'], spans['false;']
+        self.assertEqual(self.spans[-1], run_many)
+        self.assertEqual(run_many.parent_id, None)
+        self.assertEqual(run_many.attributes, {'chains': 2})
+        for span in (echo, false):
+            self.assertEqual(span.name, 'sultan.run')
+            self.assertEqual(span.trace_id, run_many.trace_id)
+            self.assertEqual(span.parent_id, run_many.span_id)
+            self.assertLessEqual(span.end_time, run_many.end_time)
+
+        self.assertEqual(echo.status, 'ok')
+        self.assertEqual(echo.attributes['rc'], 0)
+        self.assertEqual([event[0] for event in echo.events], ['spawn', 'first_output'])
+        self.assertEqual(false.status, 'error')
+        self.assertEqual(false.attributes['rc'], 1)
+
+    def test_batch(self):
+
+        with Sultan().batch() as batch:
+            batch.echo('a').run()
+            batch.echo('b').run()
+
+        self.assertEqual([span.name for span in self.spans], ['sultan.run', 'sultan.run', 'batch'])
+        self.assertEqual(self.spans[0].parent_id, self.spans[-1].span_id)
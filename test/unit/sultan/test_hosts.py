@@ -0,0 +1,118 @@
+import asyncio
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+from sultan.api import SSHConfig
+from sultan.hosts import HostGroup, HostResults, HostStream
+
+# stands in for 'ssh': runs the command locally, and fails for the host 'bad'
+FAKE_SSH = """#!/bin/sh
+for last; do :; done
+host=$(for arg; do case "$arg" in *@*) echo "${arg#*@}";; esac; done)
+echo "$host $*" >&2
+[ "$host" = bad ] && exit 255
+exec /bin/sh -c "$last"
+"""
+
+
+class HostGroupTestCase(unittest.TestCase):
+
+    def setUp(self):
+
+        self.bin = tempfile.mkdtemp()
+        ssh = os.path.join(self.bin, 'ssh')
+        with open(ssh, 'w') as f:
+            f.write(FAKE_SSH)
+        os.chmod(ssh, 0o755)
+        self.env = dict(os.environ, PATH=self.bin + os.pathsep + os.environ['PATH'])
+
+    def tearDown(self):
+
+        shutil.rmtree(self.bin)
+
+    def test_run(self):
+
+        hostnames = ['web%d' % i for i in range(5)] + ['bad']
+        with HostGroup.load(hostnames=hostnames, user='hodor', env=self.env, max_workers=3,
+                            logging=False) as group:
+            results = group.echo('hodor').run()
+
+        self.assertTrue(isinstance(results, HostResults))
+        self.assertEqual(list(results), hostnames)
+        self.assertEqual(results['web0'].stdout, ['hodor'])
+        self.assertEqual(results['web0'].stderr, ['web0 hodor@web0 echo hodor;'])
+        self.assertEqual(results.succeeded, hostnames[:-1])
+        self.assertEqual(results.failed, ['bad'])
+        self.assertEqual(results.success_count, 5)
+        self.assertEqual(results.failure_count, 1)
+        self.assertFalse(results.is_success)
+        self.assertEqual(group.commands, [])
+
+    def test_ssh_configs(self):
+
+        group = HostGroup.load(hostnames=['web1', 'db1'], user='hodor', env=self.env,
+                               ssh_config=SSHConfig(port=22),
+                               ssh_configs={'db1': SSHConfig(port=2222)})
+        results = group.true().run(quiet=True)
+
+        self.assertEqual(results['web1'].stderr, ["web1 -p 22 hodor@web1 true;"])
+        self.assertEqual(results['db1'].stderr, ["db1 -p 2222 hodor@db1 true;"])
+        self.assertTrue(results.is_success)
+
+    def test_streaming(self):
+
+        group = HostGroup.load(hostnames=['web1', 'web2', 'bad'], user='hodor', env=self.env)
+        with group.echo('hodor').run(streaming=True, quiet=True) as stream:
+            self.assertTrue(isinstance(stream, HostStream))
+            lines = sorted(stream)
+
+        self.assertEqual(lines, [
+            ('bad', 'stderr', "bad hodor@bad echo hodor;"),
+            ('web1', 'stderr', "web1 hodor@web1 echo hodor;"),
+            ('web1', 'stdout', 'hodor'),
+            ('web2', 'stderr', "web2 hodor@web2 echo hodor;"),
+            ('web2', 'stdout', 'hodor'),
+        ])
+        self.assertTrue(stream.is_complete)
+        self.assertEqual(dict(stream.returncodes), {'web1': 0, 'web2': 0, 'bad': 255})
+
+    def test_streaming_start_failure(self):
+
+        group = HostGroup.load(hostnames=['web1', 'web2'], user='hodor', env=self.env, logging=False)
+        error = OSError('no shell')
+        with mock.patch('sultan.api.Process', side_effect=error):
+            with group.echo('hodor').run(streaming=True, quiet=True) as stream:
+                self.assertEqual(list(stream), [])
+
+        self.assertEqual(dict(stream.errors), {'web1': error, 'web2': error})
+        self.assertTrue(stream.results['web1'].is_failure)
+        self.assertTrue(stream.is_complete)
+
+    def test_streaming_timeout(self):
+
+        group = HostGroup.load(hostnames=['web1'], user='hodor', env=self.env, logging=False)
+        with group.sleep(30).run(streaming=True, quiet=True, timeout=0.2) as stream:
+            self.assertEqual([line for line in stream if line[1] == 'stdout'], [])
+
+        self.assertTrue(stream.results['web1'].timed_out)
+        self.assertEqual(stream.returncodes['web1'], -9)
+
+    def test_streaming_async(self):
+
+        group = HostGroup.load(hostnames=['web1', 'web2'], user='hodor', env=self.env)
+
+        async def collect():
+            stream = group.echo('a').and_().echo('b').run(streaming=True, quiet=True)
+            return [item async for item in stream if item[1] == 'stdout']
+
+        lines = asyncio.new_event_loop().run_until_complete(collect())
+        self.assertEqual(sorted(lines), [('web1', 'stdout', 'a'), ('web1', 'stdout', 'b'),
+                                         ('web2', 'stdout', 'a'), ('web2', 'stdout', 'b')])
+
+    def test_invalid_ssh_configs(self):
+
+        with self.assertRaises(ValueError):
+            HostGroup.load(hostnames=['db1'], ssh_configs={'db1': '-p 2222'})
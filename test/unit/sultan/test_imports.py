@@ -0,0 +1,45 @@
+import os
+import subprocess
+import sys
+import unittest
+
+import sultan
+
+# loaded on first use only, see `sultan.echo` and `Sultan.run_many`
+LAZY_MODULES = ['asyncio', 'concurrent.futures', 'logging', 'queue', 'shutil', 'sultan.echo.colorlog',
+                'sultan.ssh', 'tempfile', 'traceback']
+
+CHECK = """
+import sys
+from sultan.api import Sultan
+print(' '.join(sorted(name for name in %r if name in sys.modules)))
+"""
+
+
+class ImportTestCase(unittest.TestCase):
+
+    def loaded(self, code):
+
+        env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(sultan.__file__)))
+        return subprocess.check_output([sys.executable, '-c', code], env=env, universal_newlines=True).split()
+
+    def test_lazy_modules(self):
+
+        self.assertEqual(self.loaded(CHECK % LAZY_MODULES), [])
+
+    def test_first_use(self):
+
+        code = CHECK % LAZY_MODULES + "Sultan.load().echo('hodor').run()\nprint('logging' in sys.modules)"
+        self.assertEqual(self.loaded(code), ['True'])
+
+        # nothing is logged without 'Sultan.load'
+        code = CHECK % LAZY_MODULES + "Sultan().echo('hodor').run()\nprint('logging' in sys.modules)"
+        self.assertEqual(self.loaded(code), ['False'])
+
+    def test_sultan(self):
+
+        from sultan import Sultan
+        from sultan.api import Sultan as ApiSultan
+        self.assertTrue(Sultan is ApiSultan)
+        with self.assertRaises(AttributeError):
+            sultan.Hodor
@@ -0,0 +1,128 @@
+import asyncio
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+import urllib.request
+
+from sultan.aio import AsyncSultan
+from sultan.api import Sultan
+from sultan.hooks import HookEvent
+from sultan.metrics import Counter, Histogram, Metrics, Registry
+
+
+class RegistryTestCase(unittest.TestCase):
+
+    def test_exposition(self):
+
+        registry = Registry()
+        counter = registry.register(Counter('runs_total', 'Runs.', ('name',)))
+        histogram = registry.register(Histogram('run_seconds', 'Run time.', ('name',), buckets=(0.1, 1.0)))
+        counter.inc(['a"b'])
+        counter.inc(['a"b'], 2)
+        histogram.observe(0.1, ['a'])
+        histogram.observe(0.5, ['a'])
+        histogram.observe(5, ['a'])
+
+        self.assertEqual(registry.exposition(), '\n'.join([
+            '# HELP runs_total Runs.',
+            '# TYPE runs_total counter',
+            'runs_total{name="a\\"b"} 3',
+            '# HELP run_seconds Run time.',
+            '# TYPE run_seconds histogram',
+            'run_seconds_bucket{name="a",le="0.1"} 1',
+            'run_seconds_bucket{name="a",le="1"} 2',
+            'run_seconds_bucket{name="a",le="+Inf"} 3',
+            'run_seconds_sum{name="a"} 5.6',
+            'run_seconds_count{name="a"} 3',
+        ]) + '\n')
+
+
+class MetricsTestCase(unittest.TestCase):
+
+    def setUp(self):
+
+        self.metrics = Metrics().install()
+
+    def tearDown(self):
+
+        self.metrics.uninstall()
+
+    def test_run(self):
+
+        with Sultan.load(logging=False) as s:
+            s.echo('hodor').run()
+            s.echo('hodor').and_().sleep('0.1').run()
+            s.false().run(halt_on_nonzero=False)
+            s.sleep('5').run(halt_on_nonzero=False, timeout=0.1)
+
+        self.assertEqual(self.metrics.commands.get(['echo', '', 0]), 2)
+        self.assertEqual(self.metrics.commands.get(['false', '', 1]), 1)
+        self.assertEqual(self.metrics.commands.get(['sleep', '', 'timeout']), 1)
+        count, total = self.metrics.duration.get(['echo', '', 0])
+        self.assertEqual(count, 2)
+        self.assertGreaterEqual(total, 0.1)
+
+    def test_run_many(self):
+
+        Sultan.load(logging=False).run_many(['echo a', 'echo "b c"', 'false'], halt_on_nonzero=False)
+        self.assertEqual(self.metrics.commands.get(['echo', '', 0]), 2)
+        self.assertEqual(self.metrics.commands.get(['false', '', 1]), 1)
+
+    def test_batch(self):
+
+        with Sultan().batch() as batch:
+            batch.echo('a').run(quiet=True)
+            batch.false().run(halt_on_nonzero=False, quiet=True)
+
+        self.assertEqual(self.metrics.commands.get(['echo', '', 0]), 1)
+        self.assertEqual(self.metrics.commands.get(['false', '', 1]), 1)
+
+    def test_session(self):
+
+        with Sultan.load(logging=False).session() as session:
+            session.echo('a').run()
+            session.false().run(halt_on_nonzero=False)
+
+        self.assertEqual(self.metrics.commands.get(['echo', '', 0]), 1)
+        self.assertEqual(self.metrics.commands.get(['false', '', 1]), 1)
+
+    def test_async(self):
+
+        s = AsyncSultan.load(logging=False)
+        asyncio.new_event_loop().run_until_complete(s.run_many(['echo a', 'false'], halt_on_nonzero=False))
+
+        self.assertEqual(self.metrics.commands.get(['echo', '', 0]), 1)
+        self.assertEqual(self.metrics.commands.get(['false', '', 1]), 1)
+
+    def test_running(self):
+
+        # runs that never complete are forgotten, once there are too many
+        with mock.patch.object(Metrics, 'MAX_RUNNING', 2):
+            for run_id in range(3):
+                self.metrics._on_build(HookEvent('on_build', run_id=run_id, context={}, command='sleep'))
+        self.assertEqual(list(self.metrics._running), [1, 2])
+
+        Sultan().echo('hodor').run(quiet=True)
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'sultan.prom')
+            self.metrics.write(path)
+            with open(path) as f:
+                self.assertIn('sultan_commands_total{command="echo",hostname="",status="0"} 1\n', f.read())
+            self.assertEqual(os.listdir(directory), ['sultan.prom'])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_serve(self):
+
+        Sultan().echo('hodor').run(quiet=True)
+        server = self.metrics.serve(port=0)
+        try:
+            response = urllib.request.urlopen('http://127.0.0.1:%s/metrics' % server.server_port)
+            self.assertTrue(response.headers['Content-Type'].startswith('text/plain; version=0.0.4'))
+            self.assertEqual(response.read().decode('utf-8'), self.metrics.exposition())
+        finally:
+            server.shutdown()
+            server.server_close()
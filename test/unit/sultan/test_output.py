@@ -0,0 +1,97 @@
+import mmap
+import unittest
+
+from sultan.output import BinaryOutput, SpillBuffer, TextOutput, decode
+
+
+class BinaryOutputTestCase(unittest.TestCase):
+
+    def test_lines(self):
+
+        output = BinaryOutput(b'first\nsecond\r\n\nlast')
+        self.assertEqual(len(output), 4)
+        self.assertEqual([bytes(line) for line in output],
+                         [b'first', b'second\r', b'', b'last'])
+        self.assertEqual(bytes(output[-1]), b'last')
+        self.assertEqual([bytes(line) for line in output[1:3]], [b'second\r', b''])
+        with self.assertRaises(IndexError):
+            output[4]
+
+    def test_trailing_newline(self):
+
+        output = BinaryOutput(b'first\nsecond\n')
+        self.assertEqual(list(output.offsets), [0, 6, 13])
+        self.assertEqual([bytes(line) for line in output], [b'first', b'second'])
+
+    def test_empty(self):
+
+        output = BinaryOutput()
+        self.assertFalse(output)
+        self.assertEqual(len(output), 0)
+        self.assertEqual(list(output), [])
+
+    def test_view(self):
+
+        data = b'\x1f\x8b\x08\x00\xff'
+        output = BinaryOutput(data)
+        view = output.view(1, 3)
+        self.assertTrue(isinstance(view, memoryview))
+        self.assertEqual(view.tobytes(), b'\x8b\x08')
+        self.assertTrue(view.obj is data)
+        self.assertEqual(bytes(output), data)
+
+    def test_decoded_lines(self):
+
+        output = BinaryOutput(u'h\xf6dor\n\xff'.encode('latin-1'))
+        self.assertEqual(output.lines('latin-1'), [u'h\xf6dor', u'\xff'])
+        self.assertEqual(output.lines(), [u'h�dor', u'�'])
+
+
+class TextOutputTestCase(unittest.TestCase):
+
+    def test_lines(self):
+
+        output = TextOutput(u'\n  first\r\nh\xf6dor\n\nlast  \n\n'.encode('utf-8'), 'utf-8')
+        self.assertEqual(list(output), [u'first', u'h\xf6dor', u'', u'last'])
+        self.assertEqual(output, u'\n  first\r\nh\xf6dor\n\nlast  \n\n'.strip().splitlines())
+        self.assertEqual(output[1], u'h\xf6dor')
+        self.assertEqual(output[-1], u'last')
+        self.assertEqual(output[:2], [u'first', u'h\xf6dor'])
+
+    def test_whitespace_only(self):
+
+        output = TextOutput(b' \n\n ', 'utf-8')
+        self.assertFalse(output)
+        self.assertEqual(list(output), [])
+
+
+class SpillBufferTestCase(unittest.TestCase):
+
+    def test_in_memory(self):
+
+        buffer = SpillBuffer(10)
+        buffer.write(b'01234')
+        buffer.write(b'56789')
+        self.assertFalse(buffer.spilled)
+        self.assertEqual(buffer.getvalue(), b'0123456789')
+
+    def test_spilled(self):
+
+        buffer = SpillBuffer(10)
+        buffer.write(b'01234')
+        buffer.write(b'56789\n')
+        buffer.write(b'last')
+        self.assertTrue(buffer.spilled)
+        data = buffer.getvalue()
+        self.assertTrue(isinstance(data, mmap.mmap))
+        self.assertEqual(data[:], b'0123456789\nlast')
+        self.assertEqual(list(TextOutput(data)), ['0123456789', 'last'])
+
+
+class DecodeTestCase(unittest.TestCase):
+
+    def test_decode(self):
+
+        self.assertEqual(decode(b'a\r\nb\rc\n'), 'a\nb\nc\n')
+        self.assertEqual(decode(u'h\xf6dor'.encode('utf-8'), 'utf-8'), u'h\xf6dor')
+        self.assertEqual(decode(b'\xff', 'utf-8', 'replace'), u'\ufffd')
@@ -0,0 +1,61 @@
+import getpass
+import os
+import unittest
+
+from sultan.api import SSHConfig, Sultan
+from sultan.engine import compile_argv
+from sultan.plan import ContextPlan, shell_command
+
+
+class ContextPlanTestCase(unittest.TestCase):
+
+    def test_no_context(self):
+
+        plan = ContextPlan(None)
+        self.assertEqual(plan.wrap('ls;'), 'ls;')
+        self.assertTrue(plan.env is os.environ)
+        self.assertFalse(plan.needs_shell)
+
+    def test_wrap(self):
+
+        plan = ContextPlan({'cwd': '/tmp', 'src': '/etc/profile', 'user': 'hodor', 'hostname': 'myserver.com',
+                            'ssh_config': '-p 2222', 'sudo': True})
+        self.assertEqual(plan.wrap('ls;'),
+                         "ssh -p 2222 hodor@myserver.com 'sudo su - hodor -c 'source /etc/profile && cd /tmp && ls;''")
+        self.assertTrue(plan.needs_shell)
+
+    def test_immutable(self):
+
+        plan = ContextPlan({'cwd': '/tmp'})
+        with self.assertRaises(AttributeError):
+            plan.cwd = '/'
+
+    def test_sultan(self):
+
+        user = getpass.getuser()
+        with Sultan.load(cwd='/tmp', hostname='myserver.com', ssh_config=SSHConfig(port=2222), env={'A': 'B'}) as s:
+            self.assertEqual(s.plan.env, {'A': 'B'})
+            self.assertEqual(s.plan.cwd, '/tmp')
+            self.assertEqual(s.plan.user, user)
+            self.assertEqual(str(s.ls('-lah')), "ssh -p 2222 %s@myserver.com 'cd /tmp && ls -lah;'" % user)
+            self.assertEqual(str(s), s.plan.wrap(s._build_chain()))
+            s.clear()
+
+        self.assertEqual(s.plan.wrap('ls;'), 'ls;')
+        self.assertTrue(s.plan.env is os.environ)
+
+    def test_engine(self):
+
+        s = Sultan.load(cwd='/tmp')
+        self.assertEqual(compile_argv(s.ls('-lah').commands, s.plan), ['ls', '-lah'])
+        s.clear()
+        s = Sultan.load(sudo=True)
+        self.assertEqual(compile_argv(s.ls('-lah').commands, s.plan), None)
+
+    def test_shell_command(self):
+
+        self.assertEqual(shell_command(None), '/bin/sh;')
+        self.assertEqual(shell_command({'cwd': '/tmp', 'src': '/etc/profile', 'executable': '/bin/bash'}),
+                         '/bin/bash;')
+        self.assertEqual(shell_command({'cwd': '/tmp', 'hostname': 'myserver.com', 'user': 'hodor'}),
+                         "ssh hodor@myserver.com 'sh;'")
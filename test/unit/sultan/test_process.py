@@ -0,0 +1,104 @@
+import subprocess
+import time
+import unittest
+
+from sultan.api import Sultan
+from sultan.process import Process, ResourceUsage, Timing
+
+
+class ProcessTestCase(unittest.TestCase):
+
+    def test_communicate(self):
+
+        process = Process(['sh', '-c', 'sleep 0.1; printf "a\\r\\nb"; echo c >&2'],
+                          stdin=subprocess.PIPE,
+                          stdout=subprocess.PIPE,
+                          stderr=subprocess.PIPE,
+                          universal_newlines=True)
+        self.assertEqual(process.communicate(), ('a\nb', 'c\n'))
+        self.assertEqual(process.returncode, 0)
+        self.assertGreaterEqual(process.first_output - process.clock, 0.1)
+        self.assertGreaterEqual(process.duration, 0.1)
+        self.assertTrue(isinstance(process.rusage, ResourceUsage))
+
+    def test_communicate_timeout(self):
+
+        process = Process(['sh', '-c', 'echo a; sleep 0.3; echo b'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        with self.assertRaises(subprocess.TimeoutExpired):
+            process.communicate(timeout=0.1)
+        self.assertEqual(process.communicate(), (b'a\nb\n', b''))
+
+    def test_poll(self):
+
+        process = Process(['true'])
+        while process.poll() is None:
+            time.sleep(0.01)
+        self.assertEqual(process.returncode, 0)
+        self.assertTrue(isinstance(process.rusage, ResourceUsage))
+        self.assertIsNotNone(process.duration)
+
+    def test_wait(self):
+
+        process = Process(['sleep', '5'])
+        with self.assertRaises(subprocess.TimeoutExpired):
+            process.wait(timeout=0.05)
+        process.kill()
+        self.assertEqual(process.wait(), -9)
+        self.assertEqual(process.poll(), -9)
+        self.assertTrue(isinstance(process.rusage, ResourceUsage))
+
+        with Process(['sh', '-c', 'exit 3']) as process:
+            pass
+        self.assertEqual(process.returncode, 3)
+
+    def test_combine(self):
+
+        usage = ResourceUsage.combine([ResourceUsage(1.0, 0.5, 100, 1, 2), None, ResourceUsage(2.0, 0.5, 50, 3, 4)])
+        self.assertEqual(usage.user_time, 3.0)
+        self.assertEqual(usage.system_time, 1.0)
+        self.assertEqual(usage.cpu_time, 4.0)
+        self.assertEqual(usage.max_rss, 100)
+        self.assertEqual(usage.voluntary_switches, 4)
+        self.assertEqual(usage.involuntary_switches, 6)
+        self.assertEqual(ResourceUsage.combine([None]), None)
+
+
+class ResultAccountingTestCase(unittest.TestCase):
+
+    def test_run(self):
+
+        s = Sultan()
+        chains = [
+            lambda: s.sleep('0.1'),
+            lambda: s.echo('hodor').and_().sleep('0.1'),
+            lambda: s.sleep('0.1').pipe().cat(),
+        ]
+        for chain in chains:
+            start = time.time()
+            response = chain().run()
+            self.assertTrue(isinstance(response.timing, Timing))
+            self.assertGreaterEqual(response.timing.started, start)
+            self.assertGreaterEqual(response.timing.duration, 0.1)
+            self.assertAlmostEqual(response.timing.ended, response.timing.started + response.timing.duration)
+            self.assertTrue(isinstance(response.rusage, ResourceUsage))
+            self.assertGreater(response.rusage.max_rss, 0)
+
+    def test_time_to_first_byte(self):
+
+        s = Sultan()
+        self.assertEqual(s.true().run().timing.time_to_first_byte, None)
+        response = s.sleep('0.1').and_().echo('hodor').run(max_memory=1024)
+        self.assertGreaterEqual(response.timing.time_to_first_byte, 0.1)
+
+        response = s.sleep('0.1').and_().echo('hodor').run(streaming=True)
+        while not response.is_complete:
+            time.sleep(0.01)
+        self.assertGreaterEqual(response.timing.time_to_first_byte, 0.1)
+        self.assertIsNotNone(response.rusage)
+
+    def test_without_process(self):
+
+        with Sultan().session() as session:
+            response = session.echo('hodor').run()
+        self.assertEqual(response.timing, None)
+        self.assertEqual(response.rusage, None)
@@ -39,3 +39,33 @@ ls: /root: No such file or directory
         m_subprocess.Popen().communicate.return_value = (self.stdout, self.stderr)
         result = Result(m_subprocess.Popen(), [], {})
         self.assertEqual(result.stderr, self.stderr.strip().splitlines())
+
+    @mock.patch("sultan.result.subprocess")
+    def test_iter_stdout(self, m_subprocess):
+        m_subprocess.Popen = mock.Mock()
+        m_subprocess.Popen().communicate.return_value = (self.stdout, self.stderr)
+        result = Result(m_subprocess.Popen(), [], {})
+        self.assertEqual(list(result.iter_stdout()), self.stdout.strip().splitlines())
+        self.assertEqual(list(result.iter_stderr()), self.stderr.strip().splitlines())
+
+        # once split, the cached lines are used
+        self.assertTrue(result.stdout is result.stdout)
+        self.assertEqual(list(result.iter_stdout()), self.stdout.strip().splitlines())
+
+    @mock.patch("sultan.result.subprocess")
+    def test_iter_stdout_line_breaks(self, m_subprocess):
+        m_subprocess.Popen = mock.Mock()
+        m_subprocess.Popen().communicate.return_value = ('10%\r50%\r100%\r\ndone\x0cpage\n', '')
+        result = Result(m_subprocess.Popen(), [], {})
+        self.assertEqual(list(result.iter_stdout()), ['10%', '50%', '100%', 'done', 'page'])
+        self.assertEqual(list(result.iter_stdout()), result.stdout)
+
+    @mock.patch("sultan.result.subprocess")
+    def test_empty_output(self, m_subprocess):
+        m_subprocess.Popen = mock.Mock()
+        m_subprocess.Popen().communicate.return_value = ('', None)
+        result = Result(m_subprocess.Popen(), [], {})
+        self.assertEqual(list(result.iter_stdout()), [])
+        self.assertEqual(list(result.iter_stderr()), [])
+        self.assertEqual(result.stdout, [])
+        self.assertEqual(result.stderr, [])
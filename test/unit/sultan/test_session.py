@@ -0,0 +1,86 @@
+import os
+import subprocess
+import tempfile
+import unittest
+
+from sultan.api import Sultan
+from sultan.session import Session
+
+
+class SessionTestCase(unittest.TestCase):
+
+    def test_session(self):
+
+        s = Sultan()
+        session = s.session()
+        self.assertTrue(isinstance(session, Session))
+        self.assertFalse(session.is_open)
+        self.assertEqual(str(session.ls('-lah')), 'ls -lah;')
+
+    def test_run(self):
+
+        with Sultan().session() as session:
+            result = session.echo('hodor').and_().echo('error', '>&2').run()
+            self.assertEqual(result.stdout, ['hodor'])
+            self.assertEqual(result.stderr, ['error'])
+            self.assertEqual(result.rc, 0)
+            self.assertTrue(result.is_success)
+
+            result = session.sh('-c', '"exit 3"').run(halt_on_nonzero=False)
+            self.assertEqual(result.rc, 3)
+            self.assertEqual(result.stdout, [])
+
+    def test_run_many(self):
+
+        session = Sultan().session()
+        with self.assertRaises(ValueError):
+            session.run_many(['true'])
+        with self.assertRaises(ValueError):
+            session.map('echo {}', ['a'])
+        self.assertFalse(session.is_open)
+
+    def test_state_persists(self):
+
+        with Sultan.load(cwd='/tmp') as s:
+            with s.session() as session:
+                self.assertEqual(session.pwd().run().stdout, ['/tmp'])
+                session.cd('/').run()
+                session.export('HODOR=hodor').run()
+                self.assertEqual(session.pwd().run().stdout, ['/'])
+                self.assertEqual(session.echo('$HODOR').run().stdout, ['hodor'])
+
+    def test_src(self):
+
+        handle, filepath = tempfile.mkstemp()
+        try:
+            with os.fdopen(handle, 'w') as f:
+                f.write('HODOR=hodor\n')
+            with Sultan.load(src=filepath) as s:
+                with s.session() as session:
+                    self.assertEqual(session.echo('$HODOR').run().stdout, ['hodor'])
+        finally:
+            os.unlink(filepath)
+
+    def test_output_without_newline(self):
+
+        with Sultan().session() as session:
+            result = session.printf('hodor').run()
+            self.assertEqual(result.stdout, ['hodor'])
+
+    def test_halt_on_nonzero(self):
+
+        with Sultan.load(logging=False) as s:
+            with s.session() as session:
+                with self.assertRaises(subprocess.CalledProcessError):
+                    session.ls('/no/such/directory').run()
+                self.assertEqual(session.echo('ok').run().stdout, ['ok'])
+
+    def test_exit(self):
+
+        with Sultan().session() as session:
+            result = session.exit(4).run(halt_on_nonzero=False)
+            self.assertEqual(result.rc, 4)
+            self.assertFalse(session.is_open)
+
+            # the shell is restarted
+            self.assertEqual(session.echo('hodor').run().stdout, ['hodor'])
@@ -0,0 +1,63 @@
+import mock
+import os
+import unittest
+
+from sultan.api import Sultan, SSHConfig
+from sultan.ssh import ControlMaster
+
+
+class ControlMasterTestCase(unittest.TestCase):
+
+    def test_acquire_shares_master(self):
+
+        first = ControlMaster.acquire('hodor', 'google.com')
+        second = ControlMaster.acquire('hodor', 'google.com')
+        other = ControlMaster.acquire('hodor', 'google.com', '-p 2222')
+        try:
+            self.assertTrue(first is second)
+            self.assertFalse(first is other)
+            self.assertEqual(first.references, 2)
+        finally:
+            for master in (first, second, other):
+                master.release()
+
+        self.assertEqual(first.references, 0)
+        self.assertFalse(os.path.exists(os.path.dirname(first.control_path)))
+        self.assertFalse(ControlMaster.acquire('hodor', 'google.com') is first)
+        ControlMaster.acquire('hodor', 'google.com').release()
+
+    @mock.patch('sultan.ssh.subprocess')
+    def test_close_without_connection(self, m_subprocess):
+
+        master = ControlMaster.acquire('hodor', 'google.com')
+        master.release()
+        self.assertFalse(m_subprocess.call.called)
+
+    @mock.patch('sultan.ssh.subprocess')
+    def test_close_with_connection(self, m_subprocess):
+
+        master = ControlMaster.acquire('hodor', 'google.com', '-p 2222')
+        open(master.control_path, 'w').close()
+        master.release()
+        command = m_subprocess.call.call_args[0][0]
+        self.assertEqual(command, [
+            'ssh', '-p', '2222',
+            '-o', 'ControlPath=%s' % master.control_path,
+            '-O', 'exit', 'hodor@google.com'])
+
+    def test_context(self):
+
+        config = SSHConfig(port=2345)
+        with Sultan.load(hostname='google.com', user='obama', ssh_config=config, multiplex=True) as s:
+            master = s.current_context['control_master']
+            self.assertEqual(
+                str(s.ls('-lah', '/home')),
+                "ssh -o ControlMaster=auto -o ControlPath=%s -o ControlPersist=10m -p 2345 "
+                "obama@google.com 'ls -lah /home;'" % master.control_path)
+        self.assertEqual(master.references, 0)
+
+    def test_context_without_hostname(self):
+
+        with Sultan.load(multiplex=True) as s:
+            self.assertFalse('control_master' in s.current_context)
+            self.assertEqual(str(s.ls('-lah')), 'ls -lah;')
@@ -0,0 +1,125 @@
+import functools
+import mock
+import subprocess
+import threading
+import time
+import unittest
+
+from sultan.api import Sultan
+from sultan.streams import LineBuffer, Reactor
+
+
+class LineBufferTestCase(unittest.TestCase):
+
+    def test_feed(self):
+
+        buffer = LineBuffer('utf-8')
+        self.assertEqual(buffer.feed(b'first\nsec'), ['first'])
+        self.assertEqual(buffer.feed(b'ond\r'), [])
+        self.assertEqual(buffer.feed(b'\nthird\n'), ['second', 'third'])
+        self.assertEqual(buffer.flush(), [])
+
+    def test_flush(self):
+
+        buffer = LineBuffer('utf-8')
+        self.assertEqual(buffer.feed(b'no newline'), [])
+        self.assertEqual(buffer.flush(), ['no newline'])
+
+    def test_multibyte_characters(self):
+
+        buffer = LineBuffer('utf-8')
+        data = u'hödor\n'.encode('utf-8')
+        self.assertEqual(buffer.feed(data[:2]), [])
+        self.assertEqual(buffer.feed(data[2:]), [u'hödor'])
+
+
+class ReactorTestCase(unittest.TestCase):
+
+    def test_instance(self):
+
+        self.assertTrue(Reactor.instance() is Reactor.instance())
+
+    def test_register(self):
+
+        reactor = Reactor.instance()
+        lines, exits = [], {}
+        done = threading.Event()
+
+        def on_exit(i, rc):
+            exits[i] = rc
+            if len(exits) == 20:
+                done.set()
+
+        threads = threading.active_count()
+        for i in range(20):
+            process = subprocess.Popen('echo %d; exit %d' % (i, i % 3),
+                                       shell=True,
+                                       stdout=subprocess.PIPE,
+                                       stderr=subprocess.PIPE)
+            reactor.register(process,
+                             {'stdout': process.stdout, 'stderr': process.stderr},
+                             lambda name, line: lines.append(line),
+                             functools.partial(on_exit, i))
+
+        self.assertTrue(done.wait(10))
+        self.assertEqual(threading.active_count(), threads)
+        self.assertEqual(sorted(lines, key=int), [str(i) for i in range(20)])
+        self.assertEqual(exits, dict((i, i % 3) for i in range(20)))
+
+    def test_callback_errors(self):
+
+        done = threading.Event()
+
+        def on_line(name, line):
+            raise ValueError(line)
+
+        process = subprocess.Popen('echo hodor', shell=True, stdout=subprocess.PIPE)
+        Reactor.instance().register(process, {'stdout': process.stdout}, on_line,
+                                    lambda rc: done.set())
+        self.assertTrue(done.wait(10))
+
+    def test_reap_errors(self):
+
+        exits = []
+        done = threading.Event()
+        process = subprocess.Popen('echo hodor', shell=True, stdout=subprocess.PIPE)
+        process.wait = mock.Mock(side_effect=OSError('hodor'))
+        process.poll = mock.Mock(side_effect=OSError('hodor'))
+        Reactor.instance().register(process, {'stdout': process.stdout}, lambda name, line: None,
+                                    lambda rc: (exits.append(rc), done.set()))
+        self.assertTrue(done.wait(10))
+        self.assertEqual(exits, [None])
+
+        # the reactor still serves the next process
+        done.clear()
+        process = subprocess.Popen('echo hodor', shell=True, stdout=subprocess.PIPE)
+        Reactor.instance().register(process, {'stdout': process.stdout}, lambda name, line: None,
+                                    lambda rc: (exits.append(rc), done.set()))
+        self.assertTrue(done.wait(10))
+        self.assertEqual(exits, [None, 0])
+
+    def test_invalid_output(self):
+
+        s = Sultan.load(logging=False)
+        for command, expected in ((lambda: s.printf("'\\377hodor\\n'"), [u'\ufffdhodor']),
+                                  (lambda: s.echo('ok'), ['ok'])):
+            result = command().run(streaming=True)
+            for _ in range(100):
+                if result.is_complete:
+                    break
+                time.sleep(0.05)
+            self.assertTrue(result.is_complete)
+            self.assertEqual(result.stdout, expected)
+
+    def test_call_later(self):
+
+        reactor = Reactor.instance()
+        calls = []
+        done = threading.Event()
+
+        reactor.call_later(0.2, lambda: (calls.append('late'), done.set()))
+        reactor.call_later(0.1, lambda: calls.append('early'))
+        reactor.call_later(0.05, lambda: calls.append('cancelled')).cancel()
+
+        self.assertTrue(done.wait(10))
+        self.assertEqual(calls, ['early', 'late'])